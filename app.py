@@ -2,231 +2,495 @@
 import streamlit as st
 import pandas as pd
 import sqlite3
+import hashlib
+import importlib
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import partial, wraps
+from itertools import accumulate
 from io import BytesIO
-from datetime import datetime
-from typing import List, Dict, Any
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+from sitios import SITIOS, SITIO_POR_DEFECTO
+
+_T_SCRIPT = time.perf_counter()  # inicio del rerun (para medir el primer pintado)
 
 st.set_page_config(page_title="Avances por meta", layout="wide")
-st.subheader("📈 Avances por meta - Santa Cruz")
+
+# === DELEGACIÓN (un solo proceso sirve a todas; ver sitios.py) ===
+_sitio_qp = st.query_params.get("sitio", SITIO_POR_DEFECTO)
+SITIO = st.sidebar.selectbox(
+    "Delegación", list(SITIOS),
+    index=list(SITIOS).index(_sitio_qp) if _sitio_qp in SITIOS else 0,
+    format_func=lambda k: SITIOS[k]["nombre"],
+    key="sitio",
+)
+st.query_params["sitio"] = SITIO
+
+def clave_sitio(nombre: str) -> str:
+    """Key de widget/session_state propia de la delegación activa."""
+    return f"{SITIO}_{nombre}"
+
+st.subheader(f"📈 Avances por meta - {SITIOS[SITIO]['nombre']}")
+
+# === ARRANQUE: dependencias pesadas se importan solo cuando hacen falta ===
+@st.cache_resource
+def _tiempos_arranque() -> Dict[str, Any]:
+    return {"imports_ms": {}, "primer_pintado_ms": {}}
+
+def importar_perezoso(nombre: str):
+    """Importa un módulo la primera vez que se usa y registra cuánto tardó."""
+    mod = sys.modules.get(nombre)
+    if mod is not None:
+        return mod
+    t0 = time.perf_counter()
+    mod = importlib.import_module(nombre)
+    _tiempos_arranque()["imports_ms"][nombre] = round((time.perf_counter() - t0) * 1000, 1)
+    return mod
+
+def _registrar_primer_pintado():
+    ms = round((time.perf_counter() - _T_SCRIPT) * 1000, 1)
+    tiempos = _tiempos_arranque()["primer_pintado_ms"]
+    tiempos.setdefault("arranque_en_frio", ms)
+    tiempos["ultimo_rerun"] = ms
+
+# === INSTRUMENTACIÓN POR RERUN (opcional: toggle del panel, ?perf=1 o AVANCES_PERF=1) ===
+_log_perf = logging.getLogger("avances.perf")
+if not _log_perf.handlers:
+    _h = logging.StreamHandler()
+    _h.setFormatter(logging.Formatter("%(message)s"))
+    _log_perf.addHandler(_h)
+    _log_perf.setLevel(logging.INFO)
+    _log_perf.propagate = False
+
+class MedidorRerun:
+    """Llamadas, consultas SQL, tiempo y filas por función durante un rerun.
+
+    Los tiempos son inclusivos (una función que llama a otra suma ambos).
+    """
+    def __init__(self, sitio: str, interrumpido: Optional["MedidorRerun"] = None):
+        self.sitio = sitio
+        self.inicio = time.perf_counter()
+        self.funciones: Dict[str, Dict[str, Any]] = {}
+        self.consultas = 0
+        self.cerrado = False
+        self._lock = threading.Lock()
+        if interrumpido is not None and not interrumpido.cerrado:
+            # st.rerun() cortó el rerun anterior (p. ej. tras importar): se mide como uno solo
+            self.inicio = interrumpido.inicio
+            self.funciones = {k: dict(v) for k, v in interrumpido.funciones.items()}
+            self.consultas = interrumpido.consultas
+            interrumpido.cerrado = True
+
+    def sentencia(self, sql: str):
+        if not sql.startswith("--"):  # sqlite reporta los cuerpos de triggers como comentarios
+            with self._lock:
+                self.consultas += 1
+
+    def registrar(self, nombre: str, ms: float, consultas: int, filas: Optional[int]):
+        with self._lock:
+            f = self.funciones.setdefault(nombre, {"llamadas": 0, "consultas": 0, "ms": 0.0, "filas": 0})
+            f["llamadas"] += 1
+            f["consultas"] += consultas
+            f["ms"] += ms
+            f["filas"] += filas or 0
+        if self.cerrado:  # p. ej. una descarga generada después de terminar el rerun
+            _log_perf.info(json.dumps({"evento": "diferido", "sitio": self.sitio, "funcion": nombre,
+                                       "ms": round(ms, 2), "consultas": consultas, "filas": filas}))
+
+    def cerrar(self) -> Dict[str, Any]:
+        self.cerrado = True
+        resumen = {
+            "evento": "rerun",
+            "sitio": self.sitio,
+            "rerun_ms": round((time.perf_counter() - self.inicio) * 1000, 2),
+            "consultas": self.consultas,
+            "funciones": {k: dict(v, ms=round(v["ms"], 2)) for k, v in self.funciones.items()},
+        }
+        _log_perf.info(json.dumps(resumen, ensure_ascii=False))
+        return resumen
+
+@st.cache_resource
+def _perf_local() -> threading.local:
+    # Un medidor por hilo: cada sesión ejecuta su rerun en su propio hilo
+    return threading.local()
+
+_PERF = _perf_local()
+PERF_ACTIVO = (
+    os.environ.get("AVANCES_PERF") == "1"
+    or st.query_params.get("perf") == "1"
+    or bool(st.session_state.get("perf_activo", False))
+)
+_PERF.medidor = MedidorRerun(SITIO, st.session_state.get("perf_medidor")) if PERF_ACTIVO else None
+st.session_state["perf_medidor"] = _PERF.medidor
+
+def _n_filas(res) -> Optional[int]:
+    if isinstance(res, (pd.DataFrame, list)):
+        return len(res)
+    if isinstance(res, tuple) and res and isinstance(res[0], list):
+        return len(res[0])  # (items, hay_mas)
+    if isinstance(res, dict) and "resumen" in res:
+        return len(res["resumen"]) + sum(len(v) for v in res["historial"].values())
+    return None
+
+def medido(fn):
+    """Registra la llamada en el medidor del rerun; sin medidor, llama directo."""
+    @wraps(fn)
+    def envoltura(*args, **kwargs):
+        med = getattr(_PERF, "medidor", None)
+        if med is None:
+            return fn(*args, **kwargs)
+        c0, t0 = med.consultas, time.perf_counter()
+        res = fn(*args, **kwargs)
+        med.registrar(fn.__name__, (time.perf_counter() - t0) * 1000, med.consultas - c0, _n_filas(res))
+        return res
+    return envoltura
+
+def con_medidor(fn):
+    """Para callables que corren fuera del rerun (descargas): usan el medidor de este rerun."""
+    med = getattr(_PERF, "medidor", None)
+    if med is None:
+        return fn
+    def llamar(*args, **kwargs):
+        previo = getattr(_PERF, "medidor", None)
+        _PERF.medidor = med
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _PERF.medidor = previo
+    return llamar
 
 # =========================
 # 1) CONFIG DB & DATOS BASE
 # =========================
-DB_PATH = "avances.db"
-
-# === PLAN BASE (contenido del Excel pegado aquí) ===
-# Mapeo:
-# - actividad_estrategica -> actividad (UI)
-# - meta_cuantitativa     -> meta_total (cálculos)
-PLAN_BASE = [
-    {
-        "fila": 1,
-        "indole": "Operativo",
-        "actividad_estrategica": (
-            "Coordinación y ejecución de operativos interinstitucionales nocturnos con enfoque en "
-            "objetivos estratégicos dentro del área de intervención."
-        ),
-        "zona_trabajo": "Tamarindo, Villarreal, Brasilito, Potrero y Surfside",
-        "actores": "Fuerza Pública; Policía de Tránsito; Policía de Migración; Policía Turística; DIAC",
-        "indicador_actividad": "Cantidad de operativos policiales",
-        "consideraciones": (
-            "1) Reforzar personal DIAC. 2) Considerar unidad K-9. 3) Ubicación aleatoria según análisis. "
-            "4) Operativos fugaces, de corta duración."
-        ),
-        "periodicidad": "Semanal",
-        "meta_cuantitativa": 24,
-        "responsable": "Sub Director Regional",
-        "efecto_esperado": (
-            "Reducción de actividades ilícitas y fortalecimiento de la presencia institucional en horarios de mayor riesgo."
-        ),
-    },
-    {
-        "fila": 2,
-        "indole": "Operativo",
-        "actividad_estrategica": (
-            "Despliegue de operativos presenciales en horarios nocturnos en zonas previamente identificadas como "
-            "puntos de interés, para reforzar la vigilancia, la disuasión del delito y la presencia institucional."
-        ),
-        "zona_trabajo": "Tamarindo",
-        "actores": "Fuerza Pública; Policía de Tránsito; Policía de Migración; Policía Turística; DIAC",
-        "indicador_actividad": "Cantidad de operativos policiales",
-        "consideraciones": (
-            "1) Apoyo constante de al menos 12 funcionarios de gestión durante la ejecución. "
-            "2) Disponer al menos de una unidad policial adicional/recurso móvil."
-        ),
-        "periodicidad": "Diario",
-        "meta_cuantitativa": 184,
-        "responsable": "Jefe de delegación policial de Santa Cruz",
-        "efecto_esperado": "Aumento de la percepción policial en puntos críticos mediante presencia policial visible.",
-    },
-    {
-        "fila": 3,
-        "indole": "Gestión administrativa",
-        "actividad_estrategica": (
-            "Gestión institucional mediante oficio para asignación de recurso humano y transporte policial "
-            "para garantizar cobertura operativa diaria en zonas de interés."
-        ),
-        "zona_trabajo": "Tamarindo",
-        "actores": "Fuerza Pública",
-        "indicador_actividad": "Cantidad de oficios emitidos",
-        "consideraciones": "N/A",
-        "periodicidad": "Semestral",
-        "meta_cuantitativa": 1,
-        "responsable": "Director Regional",
-        "efecto_esperado": (
-            "Asegurar presencia policial continua y eficaz en zonas priorizadas, mediante dotación oportuna del personal "
-            "y medios logísticos requeridos."
-        ),
-    },
-    {
-        "fila": 4,
-        "indole": "Preventivo",
-        "actividad_estrategica": (
-            "Ejecución de actividades cívico-policiales en espacios públicos y centros educativos, para fortalecer "
-            "vínculos comunitarios, cultura de paz, prevención y convivencia."
-        ),
-        "zona_trabajo": "Villarreal",
-        "actores": "Fuerza Pública",
-        "indicador_actividad": "Cantidad de cívicos policiales",
-        "consideraciones": "N/A",
-        "periodicidad": "Mensual",
-        "meta_cuantitativa": 6,
-        "responsable": "Director Regional",
-        "efecto_esperado": (
-            "Fortalecer el vínculo comunidad–Fuerza Pública y promover convivencia y cultura de paz, "
-            "con presencia en espacios públicos y centros educativos."
-        ),
-    },
-    {
-        "fila": 5,
-        "indole": "Operativo",
-        "actividad_estrategica": (
-            "Despliegue de operativos presenciales en horarios mixtos en puntos de interés para reforzar vigilancia, "
-            "disuasión del delito y presencia institucional."
-        ),
-        "zona_trabajo": "Flamingo",
-        "actores": "Fuerza Pública",
-        "indicador_actividad": "Cantidad de operativos policiales",
-        "consideraciones": (
-            "1) Apoyo constante de al menos 12 funcionarios de gestión. "
-            "2) Disponer al menos de una unidad policial adicional/recurso móvil."
-        ),
-        "periodicidad": "Diario",
-        "meta_cuantitativa": 184,
-        "responsable": "Jefe de delegación policial de Santa Cruz",
-        "efecto_esperado": "Aumento de la percepción policial visible en puntos críticos.",
-    },
-    {
-        "fila": 6,
-        "indole": "Operativo",
-        "actividad_estrategica": (
-            "Operativos interinstitucionales de control a ventas informales y actividades no autorizadas de cobro de "
-            "parqueo en zona costera."
-        ),
-        "zona_trabajo": "Flamingo y Brasilito",
-        "actores": "Fuerza Pública; Policía de Tránsito; Policía de Migración; Policía Turística; DIAC",
-        "indicador_actividad": "Cantidad de operativos policiales",
-        "consideraciones": "N/A",
-        "periodicidad": "Quincenal",
-        "meta_cuantitativa": 12,
-        "responsable": "Jefe de delegación policial de Santa Cruz",
-        "efecto_esperado": (
-            "Recuperar el orden en el espacio público; reducir informalidad y garantizar condiciones más seguras y "
-            "reguladas para residentes, turistas y comercios."
-        ),
-    },
-    {
-        "fila": 7,
-        "indole": "Preventivo",
-        "actividad_estrategica": (
-            "Implementación de acciones preventivas, lideradas por programas policiales, orientadas a la recuperación "
-            "y apropiación positiva de espacios públicos."
-        ),
-        "zona_trabajo": "Brasilito",
-        "actores": "Fuerza Pública",
-        "indicador_actividad": "Cantidad de acciones preventivas",
-        "consideraciones": "N/A",
-        "periodicidad": "Quincenal",
-        "meta_cuantitativa": 12,
-        "responsable": "Director Regional",
-        "efecto_esperado": (
-            "Transformar espacios públicos en entornos seguros y activos, fomentando apoyo comunitario y reduciendo "
-            "vulnerabilidades ante actividades delictivas."
-        ),
-    },
-    {
-        "fila": 8,
-        "indole": "Preventivo",
-        "actividad_estrategica": (
-            "Talleres y jornadas de sensibilización en seguridad comercial para fortalecer capacidades preventivas del "
-            "sector empresarial."
-        ),
-        "zona_trabajo": "Brasilito",
-        "actores": "Fuerza Pública",
-        "indicador_actividad": "Cantidad de talleres",
-        "consideraciones": "N/A",
-        "periodicidad": "Semestral",
-        "meta_cuantitativa": 1,
-        "responsable": "Director Regional",
-        "efecto_esperado": (
-            "Mejorar la percepción de seguridad y fortalecer la prevención del delito en el sector comercial mediante "
-            "buenas prácticas y articulación con la Fuerza Pública."
-        ),
-    },
-    {
-        "fila": 9,
-        "indole": "Operativo",
-        "actividad_estrategica": (
-            "Operativos focalizados para el abordaje e identificación de personas y vehículos vinculados a delitos "
-            "de robo en viviendas, con base en análisis de inteligencia."
-        ),
-        "zona_trabajo": "Brasilito",
-        "actores": "Fuerza Pública",
-        "indicador_actividad": "Cantidad de operativos policiales",
-        "consideraciones": "N/A",
-        "periodicidad": "Mensual",
-        "meta_cuantitativa": 6,
-        "responsable": "DIAC",
-        "efecto_esperado": (
-            "Reducir robos a viviendas mediante identificación oportuna de objetivos y fortalecimiento de la capacidad "
-            "de respuesta y disuasión policial en zonas residenciales vulnerables."
-        ),
-    },
-    {
-        "fila": 10,
-        "indole": "Preventivo",
-        "actividad_estrategica": (
-            "Capacitaciones en Seguridad Comunitaria dirigidas a estrategias inter-organizacionales para fortalecer "
-            "integración y participación en actividades preventivas."
-        ),
-        "zona_trabajo": "Brasilito",
-        "actores": "Fuerza Pública",
-        "indicador_actividad": "Cantidad de capacitaciones",
-        "consideraciones": "N/A",
-        "periodicidad": "Semestral",
-        "meta_cuantitativa": 1,
-        "responsable": "Director Regional",
-        "efecto_esperado": (
-            "Mejorar el nivel de conocimiento y la capacidad de respuesta de la población ante incidentes, promoviendo "
-            "su vinculación con estrategias de seguridad comunitaria y cohesión social."
-        ),
-    },
-]
+DB_PATH = SITIOS[SITIO]["db_path"]
+ESQUEMA_VERSION = 7  # subir al cambiar _migrar_esquema
+CHECKPOINT_CADA = 5000  # un checkpoint del ledger cada tantos ids de movimiento
+
+# === POOL DE CONEXIONES ===
+# Las conexiones viven entre reruns y sesiones: los PRAGMA se ejecutan una sola
+# vez por conexión y cada una conserva su caché de sentencias preparadas.
+BUSY_TIMEOUT_MS = 5000  # espera máxima por el lock de escritura antes de "database is locked"
+
+# Archivo del ledger: movimientos de períodos cerrados / metas completas, en un
+# archivo aparte adjuntado como `archivo` (ver archivar_movimientos)
+def ruta_archivo(db_path: str) -> str:
+    return f"{os.path.splitext(db_path)[0]}_archivo.db"
+
+SQL_ARCHIVO = """
+    CREATE TABLE IF NOT EXISTS archivo.movimientos (
+        id INTEGER PRIMARY KEY,         -- el mismo id que tenía en la base principal
+        fila INTEGER NOT NULL,
+        fecha TEXT NOT NULL,
+        fecha_iso TEXT,
+        cantidad INTEGER NOT NULL,
+        nota TEXT,
+        delta INTEGER NOT NULL,
+        archivado_en TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS archivo.idx_arch_fila_id ON movimientos(fila, id);
+
+    -- Búsqueda en las notas archivadas (se consulta con «Incluir movimientos archivados»)
+    CREATE VIRTUAL TABLE IF NOT EXISTS archivo.movimientos_fts USING fts5(
+        nota, content='movimientos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS archivo.trg_arch_fts_insert AFTER INSERT ON movimientos
+    BEGIN
+        INSERT INTO movimientos_fts (rowid, nota) VALUES (NEW.id, NEW.nota);
+    END;
+    CREATE TRIGGER IF NOT EXISTS archivo.trg_arch_fts_update AFTER UPDATE OF nota ON movimientos
+    BEGIN
+        INSERT INTO movimientos_fts (movimientos_fts, rowid, nota) VALUES ('delete', OLD.id, OLD.nota);
+        INSERT INTO movimientos_fts (rowid, nota) VALUES (NEW.id, NEW.nota);
+    END;
+    CREATE TRIGGER IF NOT EXISTS archivo.trg_arch_fts_delete AFTER DELETE ON movimientos
+    BEGIN
+        INSERT INTO movimientos_fts (movimientos_fts, rowid, nota) VALUES ('delete', OLD.id, OLD.nota);
+    END;
+"""
+
+class PoolConexiones:
+    def __init__(self, db_path: str, max_conexiones: int = 8, cached_statements: int = 256):
+        self.db_path = db_path
+        self.max_conexiones = max_conexiones
+        self.cached_statements = cached_statements
+        self._libres: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._abiertas = 0
+        self._stats = {"checkouts": 0, "devoluciones": 0, "creadas": 0, "descartadas": 0, "espera_ms": 0.0}
+
+    def _abrir(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA foreign_keys=ON;")
+        conn.execute("ATTACH DATABASE ? AS archivo;", (ruta_archivo(self.db_path),))
+        conn.execute("PRAGMA archivo.journal_mode=WAL;")
+        conn.executescript(SQL_ARCHIVO)
+        return conn
+
+    def _tomar(self) -> sqlite3.Connection:
+        t0 = time.perf_counter()
+        try:
+            conn = self._libres.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                crear = self._abiertas < self.max_conexiones
+                if crear:
+                    self._abiertas += 1
+            if crear:
+                try:
+                    conn = self._abrir()
+                except Exception:
+                    with self._lock:
+                        self._abiertas -= 1
+                    raise
+                with self._lock:
+                    self._stats["creadas"] += 1
+            else:
+                conn = self._libres.get()  # espera a que otra sesión devuelva una
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["espera_ms"] += (time.perf_counter() - t0) * 1000
+        return conn
+
+    def _devolver(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Conexión inservible: se descarta y se abrirá otra cuando haga falta
+            conn.close()
+            with self._lock:
+                self._abiertas -= 1
+                self._stats["descartadas"] += 1
+            return
+        with self._lock:
+            self._stats["devoluciones"] += 1
+        self._libres.put(conn)
+
+    @contextmanager
+    def conexion(self):
+        conn = self._tomar()
+        try:
+            yield conn
+        finally:
+            self._devolver(conn)
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            m = dict(self._stats)
+            m["abiertas"] = self._abiertas
+        m["libres"] = self._libres.qsize()
+        m["en_uso"] = m["abiertas"] - m["libres"]
+        m["espera_ms"] = round(m["espera_ms"], 2)
+        return m
+
+@st.cache_resource
+def _pool(db_path: str, esquema: int) -> PoolConexiones:
+    # `esquema` solo entra en la clave: tras una migración (p. ej. el ATTACH del
+    # archivo) no se reutilizan conexiones abiertas por la versión anterior
+    return PoolConexiones(db_path)
+
+# === ESCRITOR ÚNICO CON GROUP COMMIT ===
+# Todas las escrituras de una base pasan por un solo hilo: en vez de que cada
+# sesión pelee por el lock de SQLite y haga su propio commit, el hilo toma lo
+# que se haya encolado mientras confirmaba el lote anterior y lo confirma junto.
+MAX_LOTE_ESCRITURA = 64
+TIMEOUT_ESCRITURA_S = 30
+
+class EscritorSerial:
+    def __init__(self, db_path: str, intentos: int = 5):
+        self.db_path = db_path
+        self.intentos = intentos
+        self._cola: "queue.Queue[Tuple[Any, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"operaciones": 0, "lotes": 0, "lote_max": 0, "errores": 0, "reintentos": 0}
+        self._latencias_ms: "deque[Tuple[float, float]]" = deque(maxlen=500)  # (espera, total)
+        self._hilo: Optional[threading.Thread] = None
+        self._asegurar_hilo()
+
+    def _asegurar_hilo(self):
+        # Relanza el hilo si murió (o si el proceso se bifurcó y no lo heredó)
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name=f"escritor-{self.db_path}", daemon=True)
+                self._hilo.start()
+
+    def enviar(self, operacion) -> Future:
+        """Encola `operacion(cur)`; el Future se resuelve tras el commit de su lote."""
+        self._asegurar_hilo()
+        fut: Future = Future()
+        self._cola.put((operacion, fut, time.perf_counter()))
+        return fut
+
+    def _bucle(self):
+        _SITIO_HILO.db_path = self.db_path  # get_conn() de las operaciones apunta a esta base
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < MAX_LOTE_ESCRITURA:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            self._confirmar_lote(lote)
+
+    def _confirmar_lote(self, lote):
+        espera = 0.05
+        inicio = time.perf_counter()
+        for intento in range(self.intentos):
+            resultados = []
+            try:
+                with _pool(self.db_path, ESQUEMA_VERSION).conexion() as conn:
+                    conn.execute("BEGIN IMMEDIATE;")
+                    try:
+                        cur = conn.cursor()
+                        for operacion, _, _ in lote:
+                            # Cada operación en su savepoint: si falla, no arrastra al resto del lote
+                            cur.execute("SAVEPOINT op;")
+                            try:
+                                resultados.append((True, operacion(cur)))
+                                cur.execute("RELEASE op;")
+                            except Exception as e:
+                                cur.execute("ROLLBACK TO op;")
+                                cur.execute("RELEASE op;")
+                                resultados.append((False, e))
+                        _actualizar_checkpoints(cur)  # nuevos o invalidados por el lote
+                        conn.commit()
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                break
+            except sqlite3.OperationalError as e:
+                # Otro proceso con el lock más allá del busy_timeout: se reintenta el lote entero
+                ocupada = "locked" in str(e) or "busy" in str(e)
+                if not ocupada or intento == self.intentos - 1:
+                    resultados = [(False, e)] * len(lote)
+                    break
+                with self._lock:
+                    self._stats["reintentos"] += 1
+                time.sleep(espera)
+                espera *= 2
+            except Exception as e:
+                resultados = [(False, e)] * len(lote)
+                break
+        fin = time.perf_counter()
+        with self._lock:
+            self._stats["lotes"] += 1
+            self._stats["operaciones"] += len(lote)
+            self._stats["lote_max"] = max(self._stats["lote_max"], len(lote))
+            self._stats["errores"] += sum(1 for ok, _ in resultados if not ok)
+            for _, _, encolada in lote:
+                self._latencias_ms.append(((inicio - encolada) * 1000, (fin - encolada) * 1000))
+        for (_, fut, _), (ok, valor) in zip(lote, resultados):
+            if ok:
+                fut.set_result(valor)
+            else:
+                fut.set_exception(valor)
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            m = dict(self._stats)
+            latencias = list(self._latencias_ms)
+        m["profundidad_cola"] = self._cola.qsize()
+        m["ops_por_lote"] = round(m["operaciones"] / m["lotes"], 2) if m["lotes"] else 0.0
+        if latencias:
+            esperas = sorted(e for e, _ in latencias)
+            totales = sorted(t for _, t in latencias)
+            p95 = lambda xs: xs[min(len(xs) - 1, int(len(xs) * 0.95))]
+            m["espera_ms_media"] = round(sum(esperas) / len(esperas), 2)
+            m["latencia_ms_media"] = round(sum(totales) / len(totales), 2)
+            m["latencia_ms_p95"] = round(p95(totales), 2)
+        return m
+
+@st.cache_resource
+def _escritor(db_path: str) -> EscritorSerial:
+    return EscritorSerial(db_path)
+
+@st.cache_resource
+def _sitio_hilo() -> threading.local:
+    # Hilos fuera de la UI (API JSON) eligen la base por hilo, sin tocar DB_PATH
+    return threading.local()
+
+_SITIO_HILO = _sitio_hilo()
+
+def _db_path_actual() -> str:
+    return getattr(_SITIO_HILO, "db_path", None) or DB_PATH
+
+@contextmanager
+def _conexion_medida(med: MedidorRerun):
+    t0 = time.perf_counter()
+    with _pool(_db_path_actual(), ESQUEMA_VERSION).conexion() as conn:
+        med.registrar("get_conn", (time.perf_counter() - t0) * 1000, 0, None)  # espera del préstamo
+        conn.set_trace_callback(med.sentencia)
+        try:
+            yield conn
+        finally:
+            conn.set_trace_callback(None)
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA foreign_keys=ON;")
-    return conn
+    """Presta una conexión del pool; se devuelve al salir del bloque `with`."""
+    med = getattr(_PERF, "medidor", None)
+    if med is None:
+        return _pool(_db_path_actual(), ESQUEMA_VERSION).conexion()
+    return _conexion_medida(med)
 
 def _col_exists(cur, table, col):
     cur.execute(f"PRAGMA table_info({table});")
     cols = [r[1] for r in cur.fetchall()]
     return col in cols
 
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
+def _table_exists(cur, table):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?;", (table,))
+    return cur.fetchone() is not None
+
+def _ejecutar_script(cur, script: str):
+    """Como executescript, pero sentencia a sentencia dentro de la transacción abierta
+    (executescript hace COMMIT antes de empezar)."""
+    sentencia = ""
+    for linea in script.splitlines(keepends=True):
+        sentencia += linea
+        if sqlite3.complete_statement(sentencia):
+            cur.execute(sentencia)
+            sentencia = ""
+    if sentencia.strip():
+        cur.execute(sentencia)
+
+def _fila_plan(it: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "fila": it["fila"],
+        "actividad": it["actividad_estrategica"],
+        "meta_total": int(it["meta_cuantitativa"] or 0),
+        "indole": it.get("indole", ""),
+        "zona_trabajo": it.get("zona_trabajo", ""),
+        "actores": it.get("actores", ""),
+        "indicador_actividad": it.get("indicador_actividad", ""),
+        "consideraciones": it.get("consideraciones", ""),
+        "periodicidad": it.get("periodicidad", ""),
+        "responsable": it.get("responsable", ""),
+        "efecto_esperado": it.get("efecto_esperado", ""),
+    }
+
+def _migrar_esquema(cur, version_anterior: int):
+    """Crea/actualiza tablas, índices y triggers. Idempotente.
+
+    Corre dentro de la transacción de init_db: una tabla nueva y su carga inicial
+    se confirman juntas (si se corta a mitad, la próxima migración las rehace).
+    """
     # Tabla metas con columnas extendidas
     cur.execute("""
         CREATE TABLE IF NOT EXISTS metas (
@@ -262,18 +526,327 @@ def init_db():
         CREATE TABLE IF NOT EXISTS movimientos (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             fila INTEGER NOT NULL,
-            fecha TEXT NOT NULL,            -- DD-MM-YYYY
+            fecha TEXT NOT NULL,            -- DD-MM-YYYY (para mostrar)
+            fecha_iso TEXT,                 -- YYYY-MM-DD (ordenable, indexada)
             cantidad INTEGER NOT NULL CHECK(cantidad >= 0),
             nota TEXT,
             delta INTEGER NOT NULL,         -- con signo
             FOREIGN KEY(fila) REFERENCES metas(fila)
         );
     """)
-    conn.commit()
 
-    # Seed/Upsert con el plan embebido
-    for it in PLAN_BASE:
+    # Migración: fecha ISO ordenable + índices del ledger
+    if not _col_exists(cur, "movimientos", "fecha_iso"):
+        cur.execute("ALTER TABLE movimientos ADD COLUMN fecha_iso TEXT;")
+    cur.execute("""
+        UPDATE movimientos
+        SET fecha_iso = substr(fecha, 7, 4) || '-' || substr(fecha, 4, 2) || '-' || substr(fecha, 1, 2)
+        WHERE fecha_iso IS NULL;
+    """)
+    # Movimiento de arrastre: saldo compacto de lo que se movió al archivo (no editable)
+    if not _col_exists(cur, "movimientos", "arrastre"):
+        cur.execute("ALTER TABLE movimientos ADD COLUMN arrastre INTEGER NOT NULL DEFAULT 0;")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_mov_fila_id ON movimientos(fila, id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_mov_fecha ON movimientos(fecha_iso, fila);")
+
+    # Totales materializados: los triggers mantienen SUM(delta) por fila
+    nueva_tabla_avance = not _table_exists(cur, "avance_por_meta")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS avance_por_meta (
+            fila INTEGER PRIMARY KEY,
+            avance INTEGER NOT NULL DEFAULT 0,
+            n_movimientos INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    if not _col_exists(cur, "avance_por_meta", "n_movimientos"):
+        cur.execute("ALTER TABLE avance_por_meta ADD COLUMN n_movimientos INTEGER NOT NULL DEFAULT 0;")
+        nueva_tabla_avance = True  # recalcular también los conteos
+    _ejecutar_script(cur, """
+        CREATE TRIGGER IF NOT EXISTS trg_mov_insert AFTER INSERT ON movimientos
+        BEGIN
+            INSERT OR IGNORE INTO avance_por_meta (fila, avance) VALUES (NEW.fila, 0);
+            UPDATE avance_por_meta SET avance = avance + NEW.delta WHERE fila = NEW.fila;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_update AFTER UPDATE OF fila, delta ON movimientos
+        BEGIN
+            UPDATE avance_por_meta SET avance = avance - OLD.delta WHERE fila = OLD.fila;
+            INSERT OR IGNORE INTO avance_por_meta (fila, avance) VALUES (NEW.fila, 0);
+            UPDATE avance_por_meta SET avance = avance + NEW.delta WHERE fila = NEW.fila;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_delete AFTER DELETE ON movimientos
+        BEGIN
+            UPDATE avance_por_meta SET avance = avance - OLD.delta WHERE fila = OLD.fila;
+        END;
+    """)
+    # Conteo de movimientos por fila (para paginar sin COUNT(*) sobre el ledger)
+    _ejecutar_script(cur, """
+        CREATE TRIGGER IF NOT EXISTS trg_mov_conteo_insert AFTER INSERT ON movimientos
+        BEGIN
+            INSERT OR IGNORE INTO avance_por_meta (fila, avance) VALUES (NEW.fila, 0);
+            UPDATE avance_por_meta SET n_movimientos = n_movimientos + 1 WHERE fila = NEW.fila;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_conteo_update AFTER UPDATE OF fila ON movimientos
+        WHEN OLD.fila <> NEW.fila
+        BEGIN
+            UPDATE avance_por_meta SET n_movimientos = n_movimientos - 1 WHERE fila = OLD.fila;
+            INSERT OR IGNORE INTO avance_por_meta (fila, avance) VALUES (NEW.fila, 0);
+            UPDATE avance_por_meta SET n_movimientos = n_movimientos + 1 WHERE fila = NEW.fila;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_conteo_delete AFTER DELETE ON movimientos
+        BEGIN
+            UPDATE avance_por_meta SET n_movimientos = n_movimientos - 1 WHERE fila = OLD.fila;
+        END;
+    """)
+    # Versión del ledger: cambia con cada escritura en movimientos (clave de cachés)
+    _ejecutar_script(cur, """
+        CREATE TABLE IF NOT EXISTS ledger_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO ledger_version (id, version) VALUES (1, 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_version_insert AFTER INSERT ON movimientos
+        BEGIN
+            UPDATE ledger_version SET version = version + 1 WHERE id = 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_version_update AFTER UPDATE ON movimientos
+        BEGIN
+            UPDATE ledger_version SET version = version + 1 WHERE id = 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_version_delete AFTER DELETE ON movimientos
+        BEGIN
+            UPDATE ledger_version SET version = version + 1 WHERE id = 1;
+        END;
+    """)
+    if nueva_tabla_avance:
+        # Carga inicial desde el ledger existente
+        cur.execute("""
+            INSERT OR REPLACE INTO avance_por_meta (fila, avance, n_movimientos)
+            SELECT fila, COALESCE(SUM(delta), 0), COUNT(*) FROM movimientos GROUP BY fila;
+        """)
+
+    # Avance neto por (fila, día): base de las consultas "al día X" y del burn-up.
+    # Los triggers lo mantienen; su tamaño crece con los días, no con el ledger.
+    nueva_tabla_diaria = not _table_exists(cur, "avance_diario")
+    _ejecutar_script(cur, """
+        CREATE TABLE IF NOT EXISTS avance_diario (
+            fila INTEGER NOT NULL,
+            fecha_iso TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            n_movimientos INTEGER NOT NULL,
+            PRIMARY KEY (fila, fecha_iso)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_diario_insert AFTER INSERT ON movimientos
+        BEGIN
+            INSERT INTO avance_diario (fila, fecha_iso, delta, n_movimientos)
+            VALUES (NEW.fila, NEW.fecha_iso, NEW.delta, 1)
+            ON CONFLICT(fila, fecha_iso) DO UPDATE SET
+              delta = delta + excluded.delta, n_movimientos = n_movimientos + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_diario_update AFTER UPDATE OF fila, fecha_iso, delta ON movimientos
+        BEGIN
+            UPDATE avance_diario SET delta = delta - OLD.delta, n_movimientos = n_movimientos - 1
+            WHERE fila = OLD.fila AND fecha_iso = OLD.fecha_iso;
+            DELETE FROM avance_diario WHERE fila = OLD.fila AND fecha_iso = OLD.fecha_iso AND n_movimientos = 0;
+            INSERT INTO avance_diario (fila, fecha_iso, delta, n_movimientos)
+            VALUES (NEW.fila, NEW.fecha_iso, NEW.delta, 1)
+            ON CONFLICT(fila, fecha_iso) DO UPDATE SET
+              delta = delta + excluded.delta, n_movimientos = n_movimientos + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_diario_delete AFTER DELETE ON movimientos
+        BEGIN
+            UPDATE avance_diario SET delta = delta - OLD.delta, n_movimientos = n_movimientos - 1
+            WHERE fila = OLD.fila AND fecha_iso = OLD.fecha_iso;
+            DELETE FROM avance_diario WHERE fila = OLD.fila AND fecha_iso = OLD.fecha_iso AND n_movimientos = 0;
+        END;
+    """)
+    if nueva_tabla_diaria:
+        cur.execute("""
+            INSERT INTO avance_diario (fila, fecha_iso, delta, n_movimientos)
+            SELECT fila, fecha_iso, SUM(delta), COUNT(*) FROM movimientos GROUP BY fila, fecha_iso;
+        """)
+
+    # Checkpoints: avance por fila hasta el id `id_corte` (múltiplo de CHECKPOINT_CADA).
+    # Editar o borrar un movimiento invalida los checkpoints desde su id en adelante;
+    # _actualizar_checkpoints los reconstruye desde el último que sigue válido.
+    _ejecutar_script(cur, """
+        CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+            id_corte INTEGER PRIMARY KEY,
+            creado TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ledger_checkpoint_filas (
+            id_corte INTEGER NOT NULL,
+            fila INTEGER NOT NULL,
+            avance INTEGER NOT NULL,
+            n_movimientos INTEGER NOT NULL,
+            PRIMARY KEY (id_corte, fila)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_checkpoint_update AFTER UPDATE OF fila, delta ON movimientos
+        WHEN EXISTS (SELECT 1 FROM ledger_checkpoints WHERE id_corte >= OLD.id)
+        BEGIN
+            DELETE FROM ledger_checkpoint_filas WHERE id_corte >= OLD.id;
+            DELETE FROM ledger_checkpoints WHERE id_corte >= OLD.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_checkpoint_delete AFTER DELETE ON movimientos
+        WHEN EXISTS (SELECT 1 FROM ledger_checkpoints WHERE id_corte >= OLD.id)
+        BEGIN
+            DELETE FROM ledger_checkpoint_filas WHERE id_corte >= OLD.id;
+            DELETE FROM ledger_checkpoints WHERE id_corte >= OLD.id;
+        END;
+    """)
+
+    # Búsqueda de texto (FTS5, contenido externo): notas de movimientos y textos de metas.
+    # Los triggers replican cada alta, cambio y baja; 'rebuild' indexa lo que ya existía.
+    # Los movimientos de arrastre no se indexan (su nota no es del usuario).
+    nuevo_fts = not _table_exists(cur, "movimientos_fts")
+    if version_anterior < 7:  # triggers anteriores indexaban también el arrastre
+        for trg in ("trg_mov_fts_insert", "trg_mov_fts_update", "trg_mov_fts_delete"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {trg};")
+    _ejecutar_script(cur, """
+        CREATE VIRTUAL TABLE IF NOT EXISTS movimientos_fts USING fts5(
+            nota, content='movimientos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS metas_fts USING fts5(
+            actividad, zona_trabajo, actores, consideraciones,
+            content='metas', content_rowid='fila',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_fts_insert AFTER INSERT ON movimientos
+        WHEN NEW.arrastre = 0
+        BEGIN
+            INSERT INTO movimientos_fts (rowid, nota) VALUES (NEW.id, NEW.nota);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_fts_update AFTER UPDATE OF nota ON movimientos
+        WHEN OLD.arrastre = 0
+        BEGIN
+            INSERT INTO movimientos_fts (movimientos_fts, rowid, nota) VALUES ('delete', OLD.id, OLD.nota);
+            INSERT INTO movimientos_fts (rowid, nota) VALUES (NEW.id, NEW.nota);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_fts_delete AFTER DELETE ON movimientos
+        WHEN OLD.arrastre = 0
+        BEGIN
+            INSERT INTO movimientos_fts (movimientos_fts, rowid, nota) VALUES ('delete', OLD.id, OLD.nota);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_metas_fts_insert AFTER INSERT ON metas
+        BEGIN
+            INSERT INTO metas_fts (rowid, actividad, zona_trabajo, actores, consideraciones)
+            VALUES (NEW.fila, NEW.actividad, NEW.zona_trabajo, NEW.actores, NEW.consideraciones);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_metas_fts_update
+        AFTER UPDATE OF actividad, zona_trabajo, actores, consideraciones ON metas
+        BEGIN
+            INSERT INTO metas_fts (metas_fts, rowid, actividad, zona_trabajo, actores, consideraciones)
+            VALUES ('delete', OLD.fila, OLD.actividad, OLD.zona_trabajo, OLD.actores, OLD.consideraciones);
+            INSERT INTO metas_fts (rowid, actividad, zona_trabajo, actores, consideraciones)
+            VALUES (NEW.fila, NEW.actividad, NEW.zona_trabajo, NEW.actores, NEW.consideraciones);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_metas_fts_delete AFTER DELETE ON metas
+        BEGIN
+            INSERT INTO metas_fts (metas_fts, rowid, actividad, zona_trabajo, actores, consideraciones)
+            VALUES ('delete', OLD.fila, OLD.actividad, OLD.zona_trabajo, OLD.actores, OLD.consideraciones);
+        END;
+    """)
+    if nuevo_fts or version_anterior < 7:
+        cur.execute("INSERT INTO movimientos_fts (movimientos_fts) VALUES ('delete-all');")
+        cur.execute("INSERT INTO movimientos_fts (rowid, nota) SELECT id, nota FROM movimientos WHERE arrastre = 0;")
+        cur.execute("INSERT INTO archivo.movimientos_fts (movimientos_fts) VALUES ('rebuild');")
+    if nuevo_fts:
+        cur.execute("INSERT INTO metas_fts (metas_fts) VALUES ('rebuild');")
+
+    # Registro de cambios para exportaciones incrementales: cada alta, cambio o
+    # baja de un movimiento suma una fila con una secuencia que nunca se reutiliza.
+    # Al crearlo se registra como alta todo lo existente (caliente y archivado).
+    nuevo_registro = not _table_exists(cur, "cambios_movimientos")
+    _ejecutar_script(cur, """
+        CREATE TABLE IF NOT EXISTS cambios_movimientos (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_mov INTEGER NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D'))
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_cambios_insert AFTER INSERT ON movimientos
+        BEGIN
+            INSERT INTO cambios_movimientos (id_mov, op) VALUES (NEW.id, 'I');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_cambios_update AFTER UPDATE ON movimientos
+        BEGIN
+            INSERT INTO cambios_movimientos (id_mov, op) VALUES (NEW.id, 'U');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_mov_cambios_delete AFTER DELETE ON movimientos
+        BEGIN
+            INSERT INTO cambios_movimientos (id_mov, op) VALUES (OLD.id, 'D');
+        END;
+    """)
+    if nuevo_registro:
         cur.execute("""
+            INSERT INTO cambios_movimientos (id_mov, op)
+            SELECT id, 'I' FROM (SELECT id FROM main.movimientos UNION SELECT id FROM archivo.movimientos)
+            ORDER BY id;
+        """)
+    _actualizar_checkpoints(cur)
+
+def _actualizar_checkpoints(cur) -> int:
+    """Crea los checkpoints que falten hasta el último movimiento; devuelve cuántos.
+
+    Cada uno se arma con el anterior más la cola de ids entre ambos, así que
+    solo se recorren los movimientos posteriores al último checkpoint válido.
+    """
+    ultimo_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM movimientos;").fetchone()[0]
+    previo = cur.execute("SELECT COALESCE(MAX(id_corte), 0) FROM ledger_checkpoints;").fetchone()[0]
+    creados = 0
+    for corte in range(previo + CHECKPOINT_CADA, ultimo_id + 1, CHECKPOINT_CADA):
+        cur.execute("""
+            INSERT INTO ledger_checkpoint_filas (id_corte, fila, avance, n_movimientos)
+            SELECT ?, fila, SUM(avance), SUM(n)
+            FROM (
+                SELECT fila, avance, n_movimientos AS n FROM ledger_checkpoint_filas WHERE id_corte = ?
+                UNION ALL
+                SELECT fila, delta, 1 FROM movimientos WHERE id > ? AND id <= ?
+            )
+            GROUP BY fila;
+        """, (corte, previo, previo, corte))
+        cur.execute("INSERT INTO ledger_checkpoints (id_corte, creado) VALUES (?, ?);",
+                    (corte, datetime.now().isoformat(timespec="seconds")))
+        previo = corte
+        creados += 1
+    return creados
+
+def _hash_plan(filas_plan: List[Dict[str, Any]]) -> str:
+    datos = json.dumps(filas_plan, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(datos.encode("utf-8")).hexdigest()
+
+def _aplicar_plan(cur, filas_plan: List[Dict[str, Any]], sincronizar_plan: bool) -> int:
+    """Escribe solo las metas del plan que difieren de la tabla. Devuelve cuántas."""
+    if not filas_plan:
+        return 0
+    cols = list(filas_plan[0])  # "fila" primero
+    cur.execute(f"SELECT {', '.join(cols)} FROM metas;")
+    actuales = {r[0]: dict(zip(cols, r)) for r in cur.fetchall()}
+    if not sincronizar_plan and actuales:
+        return 0  # solo se siembra una tabla vacía
+    cambiadas = [it for it in filas_plan if actuales.get(it["fila"]) != it]
+    if cambiadas:
+        cur.executemany("""
             INSERT INTO metas
             (fila, actividad, meta_total, indole, zona_trabajo, actores, indicador_actividad,
              consideraciones, periodicidad, responsable, efecto_esperado)
@@ -286,131 +859,401 @@ def init_db():
               indicador_actividad=excluded.indicador_actividad, consideraciones=excluded.consideraciones,
               periodicidad=excluded.periodicidad, responsable=excluded.responsable,
               efecto_esperado=excluded.efecto_esperado;
-        """, {
-            "fila": it["fila"],
-            "actividad": it["actividad_estrategica"],
-            "meta_total": int(it["meta_cuantitativa"] or 0),
-            "indole": it.get("indole", ""),
-            "zona_trabajo": it.get("zona_trabajo", ""),
-            "actores": it.get("actores", ""),
-            "indicador_actividad": it.get("indicador_actividad", ""),
-            "consideraciones": it.get("consideraciones", ""),
-            "periodicidad": it.get("periodicidad", ""),
-            "responsable": it.get("responsable", ""),
-            "efecto_esperado": it.get("efecto_esperado", ""),
-        })
-    conn.commit()
-    conn.close()
-
-init_db()
+        """, cambiadas)
+    return len(cambiadas)
+
+def _leer_schema_version(cur) -> Tuple[int, Optional[str]]:
+    try:
+        cur.execute("SELECT version, plan_hash FROM schema_version WHERE id = 1;")
+    except sqlite3.OperationalError:  # base anterior al versionado
+        return 0, None
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+def init_db(plan: List[Dict[str, Any]], sincronizar_plan: bool, plan_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Migra el esquema y aplica el plan solo si cambiaron su versión o su hash.
+
+    Con la base al día es una única lectura de schema_version (sin escrituras).
+    Si no, migración, plan y versión nueva van en una sola transacción.
+    """
+    filas_plan = [_fila_plan(it) for it in plan]
+    plan_hash = plan_hash or _hash_plan(filas_plan)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        version, hash_guardado = _leer_schema_version(cur)
+        if version == ESQUEMA_VERSION and hash_guardado == plan_hash:
+            return {"migrado": False, "metas_escritas": 0}
+        conn.execute("BEGIN IMMEDIATE;")
+        version, hash_guardado = _leer_schema_version(cur)  # otro proceso pudo migrar mientras tanto
+        if version != ESQUEMA_VERSION:
+            _migrar_esquema(cur, version)
+        metas_escritas = _aplicar_plan(cur, filas_plan, sincronizar_plan) if hash_guardado != plan_hash else 0
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                plan_hash TEXT
+            );
+        """)
+        cur.execute("""
+            INSERT INTO schema_version (id, version, plan_hash) VALUES (1, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, plan_hash = excluded.plan_hash;
+        """, (ESQUEMA_VERSION, plan_hash))
+        conn.commit()
+    return {"migrado": version != ESQUEMA_VERSION, "metas_escritas": metas_escritas}
+
+@st.cache_resource(show_spinner=False)
+def _db_inicializada(db_path: str, esquema_version: int, plan_hash: str, _plan: List[Dict[str, Any]],
+                     sincronizar_plan: bool) -> Dict[str, Any]:
+    """Una vez por proceso y por (base, esquema, plan): los reruns no vuelven a tocar el esquema."""
+    return init_db(_plan, sincronizar_plan, plan_hash)
+
+_PLAN = SITIOS[SITIO]["plan"]
+_db_inicializada(DB_PATH, ESQUEMA_VERSION, _hash_plan([_fila_plan(it) for it in _PLAN]), _PLAN, SITIOS[SITIO]["sincronizar_plan"])
 
 # =========================
 # 2) CONSULTAS / ACCIONES DB
 # =========================
+SQL_METAS = """
+    SELECT fila, actividad, meta_total,
+           indole, zona_trabajo, actores, indicador_actividad,
+           consideraciones, periodicidad, responsable, efecto_esperado
+    FROM metas
+    ORDER BY fila;
+"""
+
+@medido
 def obtener_metas_df() -> pd.DataFrame:
-    conn = get_conn()
-    df = pd.read_sql_query("""
-        SELECT fila, actividad, meta_total,
-               indole, zona_trabajo, actores, indicador_actividad,
-               consideraciones, periodicidad, responsable, efecto_esperado
-        FROM metas
-        ORDER BY fila;
-    """, conn)
-    conn.close()
-    return df
+    with get_conn() as conn:
+        return pd.read_sql_query(SQL_METAS, conn)
 
+@medido
 def suma_delta_por_fila(fila: int) -> int:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT COALESCE(SUM(delta), 0) FROM movimientos WHERE fila=?;", (fila,))
-    total = cur.fetchone()[0] or 0
-    conn.close()
-    return int(total)
-
-def obtener_historial(fila: int) -> List[Dict[str, Any]]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, fecha, cantidad, nota, delta
-        FROM movimientos
-        WHERE fila=?
-        ORDER BY id ASC;
-    """, (fila,))
-    rows = cur.fetchall()
-    conn.close()
-    return [
-        {"id": r[0], "fecha": r[1], "cantidad": int(r[2]), "nota": r[3] or "", "delta": int(r[4])}
-        for r in rows
-    ]
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT avance FROM avance_por_meta WHERE fila=?;", (fila,))
+        row = cur.fetchone()
+    return int(row[0]) if row else 0
 
+Rango = Optional[Tuple[str, str]]  # (desde, hasta) en YYYY-MM-DD, ambos incluidos
+
+def _filtro_fechas(rango: Rango, col: str = "fecha_iso") -> Tuple[List[str], List[str]]:
+    """Condiciones SQL (rango sobre la columna indexada) y sus parámetros."""
+    if not rango:
+        return [], []
+    return [f"{col} BETWEEN ? AND ?"], [rango[0], rango[1]]
+
+def _fuente_movimientos(con_archivo: bool) -> str:
+    """FROM de movimientos: la tabla caliente o, con archivo, su unión con lo archivado.
+
+    La unión deja fuera los movimientos de arrastre (ya están desglosados en el
+    archivo) y las copias archivadas de un id que siga en la tabla caliente
+    (archivado interrumpido entre sus dos commits).
+    """
+    if not con_archivo:
+        return "movimientos"
+    return """(
+        SELECT id, fila, fecha, fecha_iso, cantidad, nota, delta, 0 AS arrastre
+        FROM archivo.movimientos a
+        WHERE NOT EXISTS (SELECT 1 FROM main.movimientos h WHERE h.id = a.id AND h.arrastre = 0)
+        UNION ALL
+        SELECT id, fila, fecha, fecha_iso, cantidad, nota, delta, arrastre
+        FROM main.movimientos WHERE arrastre = 0
+    )"""
+
+@medido
+def leer_ledger_df(rango: Rango = None, con_archivo: bool = False) -> pd.DataFrame:
+    """Ledger completo (o dentro de `rango`) ordenado por fila e id."""
+    conds, params = _filtro_fechas(rango)
+    with get_conn() as conn:
+        ledger = pd.read_sql_query(f"""
+            SELECT id, fila, fecha, cantidad, nota, delta
+            FROM {_fuente_movimientos(con_archivo)}
+            {"WHERE " + " AND ".join(conds) if conds else ""}
+            ORDER BY fila, id;
+        """, conn, params=params)
+    ledger["nota"] = ledger["nota"].fillna("")
+    return ledger
+
+@medido
+def leer_burnup_df() -> pd.DataFrame:
+    """Avance acumulado por fila al cierre de cada día con movimientos.
+
+    Acumula con una ventana SUM OVER sobre avance_diario (ya agrupado por
+    fila y día), así la serie crece con los días y no con el tamaño del ledger.
+    """
+    with get_conn() as conn:
+        serie = pd.read_sql_query("""
+            SELECT fila, fecha_iso,
+                   SUM(delta) OVER (PARTITION BY fila ORDER BY fecha_iso) AS acumulado
+            FROM avance_diario
+            ORDER BY fila, fecha_iso;
+        """, conn)
+    serie["fecha"] = pd.to_datetime(serie["fecha_iso"], format="%Y-%m-%d")
+    return serie[["fila", "fecha", "acumulado"]]
+
+def _rango_hasta(rango: Rango, al: Optional[str]) -> Rango:
+    """Recorta `rango` para no pasar de la fecha `al` (vista histórica)."""
+    if not al:
+        return rango
+    return (rango[0], min(rango[1], al)) if rango else ("0001-01-01", al)
+
+SQL_AVANCE_AL = """
+    SELECT fila, SUM(delta) AS avance, SUM(n_movimientos) AS n_al
+    FROM avance_diario
+    WHERE fecha_iso <= ?
+    GROUP BY fila;
+"""
+
+@medido
+def avance_al(fecha_iso: str) -> pd.DataFrame:
+    """Avance y movimientos por fila al cierre de `fecha_iso` (suma de prefijo diaria)."""
+    with get_conn() as conn:
+        return pd.read_sql_query(SQL_AVANCE_AL, conn, params=(fecha_iso,))
+
+PAGINA_HISTORIAL = 20  # movimientos por página en las burbujas de historial
+
+def _mov_dict(id_mov, fecha, cantidad, nota, delta, arrastre=0) -> Dict[str, Any]:
+    return {"id": int(id_mov), "fecha": fecha, "cantidad": int(cantidad), "nota": nota or "", "delta": int(delta),
+            "arrastre": bool(arrastre)}
+
+@medido
+def obtener_historial(fila: int, rango: Rango = None, con_archivo: bool = False) -> List[Dict[str, Any]]:
+    conds, params = _filtro_fechas(rango)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT id, fecha, cantidad, nota, delta, arrastre
+            FROM {_fuente_movimientos(con_archivo)}
+            WHERE {" AND ".join(["fila=?"] + conds)}
+            ORDER BY id ASC;
+        """, [fila] + params)
+        rows = cur.fetchall()
+    return [_mov_dict(*r) for r in rows]
+
+@medido
+def obtener_historial_pagina(fila: int, antes_de: Optional[int] = None, rango: Rango = None,
+                             tam: int = PAGINA_HISTORIAL, con_archivo: bool = False) -> Tuple[List[Dict[str, Any]], bool]:
+    """Página de historial (más recientes primero) por keyset: `id < antes_de`.
+
+    Devuelve los movimientos y si quedan más antiguos.
+    """
+    conds, params = _filtro_fechas(rango)
+    if antes_de is not None:
+        conds = ["id<?"] + conds
+        params = [antes_de] + params
+    with get_conn() as conn:
+        rows = conn.execute(f"""
+            SELECT id, fecha, cantidad, nota, delta, arrastre
+            FROM {_fuente_movimientos(con_archivo)}
+            WHERE {" AND ".join(["fila=?"] + conds)}
+            ORDER BY id DESC
+            LIMIT ?;
+        """, [fila] + params + [tam + 1]).fetchall()
+    return [_mov_dict(*r) for r in rows[:tam]], len(rows) > tam
+
+@medido
+def contar_movimientos(fila: int, rango: Rango = None, con_archivo: bool = False) -> int:
+    conds, params = _filtro_fechas(rango)
+    with get_conn() as conn:
+        return int(conn.execute(f"""
+            SELECT COUNT(*) FROM {_fuente_movimientos(con_archivo)}
+            WHERE {" AND ".join(["fila=?"] + conds)};
+        """, [fila] + params).fetchone()[0])
+
+@medido
 def meta_total_de_fila(fila: int) -> int:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT meta_total FROM metas WHERE fila=?;", (fila,))
-    row = cur.fetchone()
-    conn.close()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT meta_total FROM metas WHERE fila=?;", (fila,))
+        row = cur.fetchone()
     return int(row[0]) if row else 0
 
-def insertar_movimiento(fila: int, mov: int, nota: str) -> bool:
-    meta_total = meta_total_de_fila(fila)
-    avance_actual = suma_delta_por_fila(fila)
+def _escribir(operacion):
+    """Ejecuta `operacion(cur)` en el escritor único de la base y espera su commit.
+
+    El escritor corre cada lote dentro de BEGIN IMMEDIATE, así que lectura,
+    recorte y escritura de cada operación ven el mismo estado aunque otras
+    sesiones guarden a la vez; los errores de la operación se propagan aquí.
+    Para no esperar, usar `_escritor(...).enviar(operacion)` (devuelve un Future).
+    """
+    return _escritor(_db_path_actual()).enviar(operacion).result(timeout=TIMEOUT_ESCRITURA_S)
+
+def _meta_y_avance(cur, fila: int) -> Tuple[int, int]:
+    cur.execute("""
+        SELECT (SELECT meta_total FROM metas WHERE fila = ?),
+               (SELECT avance FROM avance_por_meta WHERE fila = ?);
+    """, (fila, fila))
+    meta_total, avance = cur.fetchone()
+    return int(meta_total or 0), int(avance or 0)
+
+def _insertar_recortado(cur, fila: int, mov: int, nota: str, ahora: datetime) -> bool:
+    """Recorta el movimiento a [0, meta_total] y lo registra; sin cambio ni nota no escribe."""
+    meta_total, avance_actual = _meta_y_avance(cur, fila)
     nuevo_avance = max(0, min(meta_total, avance_actual + int(mov)))
     delta_real = int(nuevo_avance - avance_actual)
-    if delta_real == 0 and not (nota or "").strip():
+    if delta_real == 0 and not nota:
         return False
-    fecha = datetime.now().strftime("%d-%m-%Y")
-    conn = get_conn()
-    cur = conn.cursor()
     cur.execute("""
-        INSERT INTO movimientos (fila, fecha, cantidad, nota, delta)
-        VALUES (?, ?, ?, ?, ?);
-    """, (fila, fecha, abs(delta_real), (nota or "").strip(), delta_real))
-    conn.commit()
-    conn.close()
+        INSERT INTO movimientos (fila, fecha, fecha_iso, cantidad, nota, delta)
+        VALUES (?, ?, ?, ?, ?, ?);
+    """, (fila, ahora.strftime("%d-%m-%Y"), ahora.strftime("%Y-%m-%d"),
+          abs(delta_real), nota, delta_real))
     return True
 
+@medido
+def insertar_movimiento(fila: int, mov: int, nota: str) -> bool:
+    nota = (nota or "").strip()
+    return _escribir(lambda cur: _insertar_recortado(cur, fila, mov, nota, datetime.now()))
+
+@medido
+def insertar_movimientos_lote(entradas: List[Tuple[int, int, str]]) -> int:
+    """Registra varios (fila, movimiento, nota) en una sola transacción.
+
+    Cada entrada se recorta igual que en `insertar_movimiento`, en orden y
+    viendo el avance que dejaron las anteriores. Devuelve cuántas se
+    registraron; si una falla, no se registra ninguna.
+    """
+    entradas = [(int(f), int(m), (n or "").strip()) for f, m, n in entradas]
+
+    def _op(cur) -> int:
+        ahora = datetime.now()
+        return sum(_insertar_recortado(cur, f, m, n, ahora) for f, m, n in entradas)
+
+    return _escribir(_op) if entradas else 0
+
+@medido
 def actualizar_movimiento(id_mov: int, fila: int, nueva_cant: int, nueva_nota: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT delta FROM movimientos WHERE id=?;", (id_mov,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return
-    old_delta = int(row[0])
-    sign = 1 if old_delta >= 0 else -1
-    cur.execute("SELECT COALESCE(SUM(delta),0) FROM movimientos WHERE fila=? AND id<>?;", (fila, id_mov))
-    avance_sin = int(cur.fetchone()[0] or 0)
-    meta_total = meta_total_de_fila(fila)
-    nuevo_delta_deseado = sign * int(nueva_cant)
-    min_allowed = -avance_sin
-    max_allowed = meta_total - avance_sin
-    nuevo_delta = max(min_allowed, min(max_allowed, nuevo_delta_deseado))
-    nueva_cant_recortada = abs(int(nuevo_delta))
-    cur.execute("""
-        UPDATE movimientos
-        SET cantidad = ?, nota = ?, delta = ?
-        WHERE id = ?;
-    """, (nueva_cant_recortada, (nueva_nota or "").strip(), nuevo_delta, id_mov))
-    conn.commit()
-    conn.close()
+    def _op(cur):
+        cur.execute("SELECT delta FROM movimientos WHERE id=? AND arrastre=0;", (id_mov,))
+        row = cur.fetchone()
+        if not row:
+            return
+        old_delta = int(row[0])
+        sign = 1 if old_delta >= 0 else -1
+        meta_total, avance = _meta_y_avance(cur, fila)
+        avance_sin = avance - old_delta
+        nuevo_delta_deseado = sign * int(nueva_cant)
+        min_allowed = -avance_sin
+        max_allowed = meta_total - avance_sin
+        nuevo_delta = max(min_allowed, min(max_allowed, nuevo_delta_deseado))
+        nueva_cant_recortada = abs(int(nuevo_delta))
+        cur.execute("""
+            UPDATE movimientos
+            SET cantidad = ?, nota = ?, delta = ?
+            WHERE id = ?;
+        """, (nueva_cant_recortada, (nueva_nota or "").strip(), nuevo_delta, id_mov))
 
-def eliminar_movimiento(id_mov: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM movimientos WHERE id=?;", (id_mov,))
-    conn.commit()
-    conn.close()
+    _escribir(_op)
 
-def obtener_resumen_df() -> pd.DataFrame:
-    metas = obtener_metas_df()
-    conn = get_conn()
-    avances = pd.read_sql_query("""
-        SELECT fila, COALESCE(SUM(delta),0) AS avance
-        FROM movimientos
-        GROUP BY fila;
-    """, conn)
-    conn.close()
+@medido
+def eliminar_movimiento(id_mov: int):
+    _escribir(lambda cur: cur.execute("DELETE FROM movimientos WHERE id=? AND arrastre=0;", (id_mov,)))
+
+# === IMPORTACIÓN MASIVA (CSV / Excel) ===
+COLS_IMPORTACION = ["fila", "fecha", "cantidad", "nota"]
+
+def leer_archivo_movimientos(nombre: str, contenido: bytes) -> pd.DataFrame:
+    """Lee un CSV/XLSX con columnas fila, fecha, cantidad, nota (fecha y nota opcionales)."""
+    if nombre.lower().endswith((".xlsx", ".xlsm")):
+        crudo = pd.read_excel(BytesIO(contenido), dtype=object)
+    else:
+        crudo = pd.read_csv(BytesIO(contenido), dtype=object, sep=None, engine="python")
+    crudo.columns = [str(c).strip().lower() for c in crudo.columns]
+    faltan = {"fila", "cantidad"} - set(crudo.columns)
+    if faltan:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(sorted(faltan))}")
+    for col in COLS_IMPORTACION:
+        if col not in crudo.columns:
+            crudo[col] = None
+    return crudo[COLS_IMPORTACION]
+
+@medido
+def importar_movimientos(crudo: pd.DataFrame) -> pd.DataFrame:
+    """Valida, recorta e inserta un lote de movimientos en una sola transacción.
+
+    Reproduce `insertar_movimiento` fila a fila: cada cantidad (con signo) se
+    suma al avance acumulado de su meta y se recorta a [0, meta_total]; si el
+    recorte deja el movimiento en 0 y no hay nota, se rechaza. Dentro de cada
+    meta se aplica por fecha (y orden del archivo). Devuelve un reporte por
+    línea con estado aceptada / recortada / rechazada.
+    """
+    rep = pd.DataFrame({"linea": range(2, len(crudo) + 2)}, index=crudo.index)
+    fila = pd.to_numeric(crudo["fila"], errors="coerce")
+    cantidad = pd.to_numeric(crudo["cantidad"], errors="coerce")
+    fila_invalida = fila.isna() | (fila != fila.round())
+    cantidad_invalida = cantidad.isna() | (cantidad != cantidad.round())
+    texto_fecha = crudo["fecha"].astype(str).str.strip()
+    sin_fecha = crudo["fecha"].isna() | (texto_fecha == "")
+    es_iso = texto_fecha.str.match(r"^\d{4}-\d{2}-\d{2}")
+    fecha = pd.to_datetime(crudo["fecha"].where(~sin_fecha & ~es_iso), format="mixed", dayfirst=True, errors="coerce")
+    fecha = fecha.fillna(pd.to_datetime(texto_fecha.where(es_iso).str[:10], format="%Y-%m-%d", errors="coerce"))
+    fecha_invalida = fecha.isna() & ~sin_fecha
+    fecha = fecha.fillna(pd.Timestamp(date.today()))
+    rep["fila"] = fila.where(~fila_invalida).astype("Int64")
+    rep["fecha"] = fecha.dt.strftime("%d-%m-%Y").where(~fecha_invalida, texto_fecha)
+    rep["cantidad"] = cantidad.where(~cantidad_invalida).astype("Int64")
+    rep["nota"] = crudo["nota"].fillna("").astype(str).str.strip()
+    rep["estado"] = "aceptada"
+    rep["delta_aplicado"] = 0
+    rep["motivo"] = ""
+
+    def _rechazar(mascara, motivo: str):
+        nuevas = mascara & (rep["estado"] != "rechazada")
+        rep.loc[nuevas, ["estado", "motivo"]] = ["rechazada", motivo]
+
+    _rechazar(fila_invalida, "fila inválida")
+    _rechazar(cantidad_invalida, "cantidad inválida")
+    _rechazar(fecha_invalida, "fecha inválida")
+
+    def _op(cur) -> int:
+        filas = sorted(int(f) for f in rep.loc[rep["estado"] != "rechazada", "fila"].unique())
+        if not filas:
+            return 0
+        marcas = ",".join("?" * len(filas))
+        cur.execute(f"""
+            SELECT mt.fila, mt.meta_total, COALESCE(a.avance, 0)
+            FROM metas mt LEFT JOIN avance_por_meta a ON a.fila = mt.fila
+            WHERE mt.fila IN ({marcas});
+        """, filas)
+        estado_metas = {int(f): (int(m), int(a)) for f, m, a in cur.fetchall()}
+        _rechazar(~rep["fila"].isin(list(estado_metas)).fillna(False), "la meta no existe")
+
+        validas = rep[rep["estado"] != "rechazada"].assign(_orden=fecha).sort_values(
+            ["fila", "_orden"], kind="stable"
+        )
+        for f, grupo in validas.groupby("fila", sort=False):
+            meta_total, avance = estado_metas[int(f)]
+            acumulado = list(accumulate(
+                grupo["cantidad"].astype(int), lambda s, x: max(0, min(meta_total, s + x)), initial=avance
+            ))
+            rep.loc[grupo.index, "delta_aplicado"] = [b - a for a, b in zip(acumulado, acumulado[1:])]
+
+        vivas = rep["estado"] != "rechazada"
+        _rechazar(vivas & (rep["delta_aplicado"] == 0) & (rep["nota"] == ""), "sin efecto: meta en el límite y sin nota")
+        vivas = rep["estado"] != "rechazada"
+        recortadas = vivas & (rep["delta_aplicado"] != rep["cantidad"])
+        rep.loc[recortadas, ["estado", "motivo"]] = ["recortada", "recortada a [0, meta_total]"]
+
+        a_insertar = rep[rep["estado"] != "rechazada"].assign(_orden=fecha).sort_values(
+            ["fila", "_orden"], kind="stable"
+        )
+        delta = a_insertar["delta_aplicado"].astype(int)
+        cur.executemany("""
+            INSERT INTO movimientos (fila, fecha, fecha_iso, cantidad, nota, delta)
+            VALUES (?, ?, ?, ?, ?, ?);
+        """, zip(
+            a_insertar["fila"].astype(int).tolist(), a_insertar["fecha"].tolist(),
+            a_insertar["_orden"].dt.strftime("%Y-%m-%d").tolist(), delta.abs().tolist(),
+            a_insertar["nota"].tolist(), delta.tolist(),
+        ))
+        return len(a_insertar)
+
+    _escribir(_op)
+    rep["delta_aplicado"] = rep["delta_aplicado"].astype(int)
+    return rep.reset_index(drop=True)
+
+def _resumen_desde(metas: pd.DataFrame, avances: pd.DataFrame) -> pd.DataFrame:
     df = metas.merge(avances, on="fila", how="left").fillna({"avance": 0})
     df["avance"] = df["avance"].astype(int)
     df["limite_restante"] = df["meta_total"] - df["avance"]
@@ -423,44 +1266,547 @@ def obtener_resumen_df() -> pd.DataFrame:
     )
     return df.sort_values("fila").reset_index(drop=True)
 
+@medido
+def obtener_resumen_df() -> pd.DataFrame:
+    metas = obtener_metas_df()
+    with get_conn() as conn:
+        avances = pd.read_sql_query("SELECT fila, avance FROM avance_por_meta;", conn)
+    return _resumen_desde(metas, avances)
+
+def _avance_checkpoint_mas_cola(cur, hasta_id: int, fila: Optional[int] = None) -> pd.DataFrame:
+    """avance y n_movimientos por fila con id <= hasta_id: checkpoint previo + cola."""
+    corte = cur.execute(
+        "SELECT COALESCE(MAX(id_corte), 0) FROM ledger_checkpoints WHERE id_corte <= ?;", (hasta_id,)
+    ).fetchone()[0]
+    filtro_fila = "AND fila = ?" if fila is not None else ""
+    extra = [fila] if fila is not None else []
+    filas = cur.execute(f"""
+        SELECT fila, SUM(avance), SUM(n)
+        FROM (
+            SELECT fila, avance, n_movimientos AS n FROM ledger_checkpoint_filas
+            WHERE id_corte = ? {filtro_fila}
+            UNION ALL
+            SELECT fila, delta, 1 FROM movimientos WHERE id > ? AND id <= ? {filtro_fila}
+        )
+        GROUP BY fila ORDER BY fila;
+    """, [corte] + extra + [corte, hasta_id] + extra).fetchall()
+    return pd.DataFrame(filas, columns=["fila", "avance", "n_movimientos"])
+
+@medido
+def avance_hasta_id(hasta_id: int) -> pd.DataFrame:
+    """Avance por fila tal como estaba justo después del movimiento `hasta_id`."""
+    with get_conn() as conn:
+        return _avance_checkpoint_mas_cola(conn.cursor(), hasta_id)
+
+@medido
+def saldos_movimientos(fila: int, ids: List[int], con_archivo: bool = False) -> Dict[int, int]:
+    """Avance de la meta inmediatamente después de cada movimiento de `ids`.
+
+    Parte del checkpoint anterior al id más viejo y acumula solo la cola de
+    esa fila (idx_mov_fila_id), sin recorrer el resto del ledger. Con
+    `con_archivo` (vista histórica) acumula la fila entera, archivo incluido.
+    """
+    if not ids:
+        return {}
+    if con_archivo:
+        with get_conn() as conn:
+            acumulado = conn.execute(f"""
+                SELECT id, SUM(delta) OVER (ORDER BY id) FROM {_fuente_movimientos(True)}
+                WHERE fila = ? AND id <= ?;
+            """, (fila, max(ids))).fetchall()
+        buscados = set(ids)
+        return {i: s for i, s in acumulado if i in buscados}
+    with get_conn() as conn:
+        cur = conn.cursor()
+        corte = cur.execute(
+            "SELECT COALESCE(MAX(id_corte), 0) FROM ledger_checkpoints WHERE id_corte < ?;", (min(ids),)
+        ).fetchone()[0]
+        base = cur.execute(
+            "SELECT avance FROM ledger_checkpoint_filas WHERE id_corte = ? AND fila = ?;", (corte, fila)
+        ).fetchone()
+        cola = cur.execute("""
+            SELECT id, SUM(delta) OVER (ORDER BY id) FROM movimientos
+            WHERE fila = ? AND id > ? AND id <= ?;
+        """, (fila, corte, max(ids))).fetchall()
+    base = base[0] if base else 0
+    buscados = set(ids)
+    return {i: base + s for i, s in cola if i in buscados}
+
+def _diferencias_avance(cur) -> pd.DataFrame:
+    ultimo_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM movimientos;").fetchone()[0]
+    esperado = _avance_checkpoint_mas_cola(cur, ultimo_id)
+    actual = pd.DataFrame(
+        cur.execute("SELECT fila, avance, n_movimientos FROM avance_por_meta;").fetchall(),
+        columns=["fila", "avance", "n_movimientos"],
+    )
+    cmp = esperado.merge(actual, on="fila", how="outer", suffixes=("_ledger", "_tabla")).fillna(0).astype(int)
+    distinto = (cmp["avance_ledger"] != cmp["avance_tabla"]) | (cmp["n_movimientos_ledger"] != cmp["n_movimientos_tabla"])
+    return cmp[distinto].reset_index(drop=True)
+
+@medido
+def verificar_avances() -> pd.DataFrame:
+    """Filas donde avance_por_meta no coincide con checkpoint + cola (vacío si todo cuadra)."""
+    with get_conn() as conn:
+        conn.execute("BEGIN;")  # ledger y totales del mismo instante
+        difs = _diferencias_avance(conn.cursor())
+        conn.commit()
+    return difs
+
+def reparar_avances() -> int:
+    """Corrige avance_por_meta desde checkpoint + cola; devuelve cuántas filas cambió."""
+    def _op(cur) -> int:
+        difs = _diferencias_avance(cur)
+        cur.executemany("""
+            INSERT INTO avance_por_meta (fila, avance, n_movimientos) VALUES (?, ?, ?)
+            ON CONFLICT(fila) DO UPDATE SET avance = excluded.avance, n_movimientos = excluded.n_movimientos;
+        """, difs[["fila", "avance_ledger", "n_movimientos_ledger"]].values.tolist())
+        return len(difs)
+    return _escribir(_op)
+
+# === ARCHIVO DEL LEDGER ===
+def _cortes_archivo(cur, corte: Optional[str], incluir_completas: bool) -> Dict[int, int]:
+    """Por fila, el id hasta el que se archiva (inclusive).
+
+    Se archiva un prefijo por id: todo lo anterior al primer movimiento con
+    fecha >= `corte` (período abierto), o la fila entera si la meta está
+    completa. Solo cuentan las filas con algo más que su arrastre previo.
+    """
+    cortes: Dict[int, int] = {}
+    if corte:
+        cortes.update(cur.execute("""
+            SELECT mv.fila, MAX(mv.id) FROM movimientos mv
+            WHERE mv.id < COALESCE((SELECT MIN(x.id) FROM movimientos x
+                                    WHERE x.fila = mv.fila AND x.arrastre = 0 AND x.fecha_iso >= ?), 9e18)
+            GROUP BY mv.fila;
+        """, (corte,)).fetchall())
+    if incluir_completas:
+        for fila, hasta in cur.execute("""
+            SELECT mv.fila, MAX(mv.id) FROM movimientos mv
+            JOIN metas m ON m.fila = mv.fila JOIN avance_por_meta a ON a.fila = mv.fila
+            WHERE m.meta_total > 0 AND a.avance >= m.meta_total
+            GROUP BY mv.fila;
+        """).fetchall():
+            cortes[fila] = max(hasta, cortes.get(fila, 0))
+    return {
+        f: h for f, h in cortes.items()
+        if cur.execute("SELECT 1 FROM movimientos WHERE fila = ? AND id <= ? AND arrastre = 0 LIMIT 1;",
+                       (f, h)).fetchone()
+    }
+
+@medido
+def archivar_movimientos(corte: Optional[str], incluir_completas: bool = False) -> Dict[str, int]:
+    """Mueve al archivo los movimientos de períodos cerrados (fecha < `corte`) y/o de metas completas.
+
+    Cada fila archivada deja un movimiento de arrastre con la suma de lo que
+    se fue, con el id del último archivado: avance_por_meta, los saldos por id
+    y avance_diario (recalculado con el archivo) no cambian. Son dos commits:
+    la copia en el archivo y después la baja en la base principal, solo de lo
+    que ya está copiado tal cual; si algo se corta entre ambos, repetir el
+    archivado lo completa.
+    """
+    ahora = datetime.now().isoformat(timespec="seconds")
+
+    def _copiar(cur) -> Dict[int, int]:
+        cortes = _cortes_archivo(cur, corte, incluir_completas)
+        for fila, hasta in cortes.items():
+            # upsert y no INSERT OR REPLACE: el reemplazo no dispara los triggers de borrado (FTS)
+            cur.execute("""
+                INSERT INTO archivo.movimientos
+                (id, fila, fecha, fecha_iso, cantidad, nota, delta, archivado_en)
+                SELECT id, fila, fecha, fecha_iso, cantidad, nota, delta, ?
+                FROM main.movimientos WHERE fila = ? AND id <= ? AND arrastre = 0
+                ON CONFLICT(id) DO UPDATE SET
+                  fila = excluded.fila, fecha = excluded.fecha, fecha_iso = excluded.fecha_iso,
+                  cantidad = excluded.cantidad, nota = excluded.nota, delta = excluded.delta,
+                  archivado_en = excluded.archivado_en;
+            """, (ahora, fila, hasta))
+        return cortes
+
+    def _compactar(cur) -> int:
+        n = 0
+        # el registro de cambios no ve el archivado: lo que se anota desde acá
+        # (bajas de lo archivado, arrastre viejo y nuevo) se descarta al final
+        ultimo_cambio = cur.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios_movimientos;").fetchone()[0]
+        for fila, hasta in cortes.items():
+            # lo que se borra: arrastre previo + lo copiado sin cambios desde _copiar
+            prefijo = """
+                FROM main.movimientos m WHERE m.fila = ? AND m.id <= ? AND (m.arrastre = 1 OR EXISTS (
+                    SELECT 1 FROM archivo.movimientos a WHERE a.id = m.id AND a.delta = m.delta
+                    AND a.cantidad = m.cantidad AND a.fecha = m.fecha AND a.nota IS m.nota))
+            """
+            suma, n_arch, fecha_iso = cur.execute(
+                f"SELECT SUM(m.delta), SUM(1 - m.arrastre), MAX(m.fecha_iso) {prefijo};", (fila, hasta)
+            ).fetchone()
+            if not n_arch:
+                continue
+            cur.execute(f"DELETE FROM main.movimientos WHERE id IN (SELECT m.id {prefijo});", (fila, hasta))
+            total_arch = cur.execute("SELECT COUNT(*) FROM archivo.movimientos WHERE fila = ?;", (fila,)).fetchone()[0]
+            cur.execute("""
+                INSERT INTO movimientos (id, fila, fecha, fecha_iso, cantidad, nota, delta, arrastre)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1);
+            """, (hasta, fila, date.fromisoformat(fecha_iso).strftime("%d-%m-%Y"), fecha_iso, abs(suma), f"Saldo arrastrado: {total_arch} movimiento(s) en el archivo", suma))
+            # avance_diario conserva el detalle por día (archivo + tabla caliente, sin el arrastre)
+            cur.execute("DELETE FROM avance_diario WHERE fila = ?;", (fila,))
+            cur.execute(f"""
+                INSERT INTO avance_diario (fila, fecha_iso, delta, n_movimientos)
+                SELECT fila, fecha_iso, SUM(delta), COUNT(*) FROM {_fuente_movimientos(True)}
+                WHERE fila = ? GROUP BY fila, fecha_iso;
+            """, (fila,))
+            n += n_arch
+        cur.execute("DELETE FROM cambios_movimientos WHERE seq > ?;", (ultimo_cambio,))
+        return n
+
+    cortes = _escribir(_copiar)
+    archivados = _escribir(_compactar) if cortes else 0
+    return {"filas": len(cortes), "archivados": archivados}
+
+@medido
+def estado_archivo() -> Dict[str, Any]:
+    ruta = ruta_archivo(_db_path_actual())
+    with get_conn() as conn:
+        n_arch, ultimo = conn.execute("SELECT COUNT(*), MAX(archivado_en) FROM archivo.movimientos;").fetchone()
+        n_hot, n_arrastre = conn.execute("SELECT COUNT(*), COALESCE(SUM(arrastre), 0) FROM movimientos;").fetchone()
+    return {"archivados": n_arch, "ultimo_archivado": ultimo, "en_tabla": n_hot, "arrastres": n_arrastre,
+            "archivo_mb": round(sum(os.path.getsize(r) for r in (ruta, ruta + "-wal") if os.path.exists(r)) / 2**20, 2)}
+
+CAMBIOS_MAX = 50_000  # cambios por exportación incremental
+
+@medido
+def cambios_desde(marca: int, limite: int = CAMBIOS_MAX) -> Tuple[pd.DataFrame, int, bool]:
+    """Movimientos dados de alta, modificados o borrados después de la marca `marca`.
+
+    Un movimiento con varios cambios sale una sola vez, con su estado actual y
+    la secuencia de su último cambio; los borrados salen como lápida
+    (`op = 'delete'`, sin datos). Los movimientos archivados siguen vigentes
+    y el archivado no genera cambios. Devuelve (cambios, nueva marca, hay_mas).
+    """
+    with get_conn() as conn:
+        cambios = pd.read_sql_query("""
+            WITH ultimos AS (
+                SELECT id_mov, MAX(seq) AS seq
+                FROM cambios_movimientos WHERE seq > ?
+                GROUP BY id_mov
+                ORDER BY seq
+                LIMIT ?
+            )
+            SELECT u.seq,
+                   CASE WHEN h.id IS NULL AND a.id IS NULL THEN 'delete' ELSE 'upsert' END AS op,
+                   u.id_mov AS id,
+                   COALESCE(h.fila, a.fila) AS fila, mt.actividad,
+                   COALESCE(h.fecha, a.fecha) AS fecha, COALESCE(h.fecha_iso, a.fecha_iso) AS fecha_iso,
+                   COALESCE(h.cantidad, a.cantidad) AS cantidad, COALESCE(h.delta, a.delta) AS delta,
+                   CASE WHEN h.id IS NULL AND a.id IS NULL THEN NULL
+                        ELSE COALESCE(h.nota, a.nota, '') END AS nota
+            FROM ultimos u
+            LEFT JOIN main.movimientos h ON h.id = u.id_mov AND h.arrastre = 0
+            LEFT JOIN archivo.movimientos a ON a.id = u.id_mov AND h.id IS NULL
+            LEFT JOIN metas mt ON mt.fila = COALESCE(h.fila, a.fila)
+            ORDER BY u.seq;
+        """, conn, params=(marca, limite + 1))
+    hay_mas = len(cambios) > limite
+    cambios = cambios.iloc[:limite]
+    for col in ("fila", "cantidad", "delta"):
+        cambios[col] = cambios[col].astype("Int64")  # nulos en las lápidas
+    nueva_marca = int(cambios["seq"].iloc[-1]) if len(cambios) else marca
+    return cambios, nueva_marca, hay_mas
+
+def exportar_cambios(marca: int, formato: str = "csv", limite: int = CAMBIOS_MAX) -> Tuple[bytes, int, bool]:
+    """`cambios_desde` serializado como CSV o NDJSON (una línea JSON por cambio)."""
+    cambios, nueva_marca, hay_mas = cambios_desde(marca, limite)
+    if formato == "ndjson":
+        datos = cambios.to_json(orient="records", lines=True, force_ascii=False) if len(cambios) else ""
+    elif formato == "csv":
+        datos = cambios.to_csv(index=False)
+    else:
+        raise ValueError(f"formato desconocido: {formato}")
+    return datos.encode("utf-8"), nueva_marca, hay_mas
+
+BUSQUEDA_MAX = 50  # resultados por grupo (metas / notas)
+
+def _consulta_fts(texto: str) -> str:
+    """Texto libre -> consulta FTS5: cada palabra entre comillas (sin operadores), la última como prefijo."""
+    palabras = [p.replace('"', '""') for p in texto.split()]
+    return " ".join(f'"{p}"' for p in palabras) + ("*" if palabras else "")
+
+SQL_NOTAS_FTS = """
+    SELECT mv.id, mv.fila, mv.fecha, mv.cantidad, mv.delta,
+           snippet(movimientos_fts, 0, '«', '»', '…', 16) AS nota, movimientos_fts.rank AS rango
+    FROM {esquema}.movimientos_fts
+    JOIN {esquema}.movimientos mv ON mv.id = movimientos_fts.rowid
+    WHERE movimientos_fts MATCH ?
+"""
+
+@medido
+def buscar_texto(texto: str, limite: int = BUSQUEDA_MAX, con_archivo: bool = False) -> Dict[str, pd.DataFrame]:
+    """Coincidencias en notas de movimientos y textos de metas, ordenadas por relevancia (bm25).
+
+    Los fragmentos resaltan los términos entre «». Con `con_archivo` también
+    se buscan las notas archivadas (salvo copias de un id que siga en la tabla).
+    """
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return {"metas": pd.DataFrame(), "notas": pd.DataFrame()}
+    with get_conn() as conn:
+        metas = pd.read_sql_query("""
+            SELECT m.fila, m.actividad, snippet(metas_fts, -1, '«', '»', '…', 12) AS coincidencia
+            FROM metas_fts JOIN metas m ON m.fila = metas_fts.rowid
+            WHERE metas_fts MATCH ?
+            ORDER BY metas_fts.rank
+            LIMIT ?;
+        """, conn, params=(consulta, limite))
+        fuentes, params = [SQL_NOTAS_FTS.format(esquema="main")], [consulta]
+        if con_archivo:
+            fuentes.append(SQL_NOTAS_FTS.format(esquema="archivo")
+                           + " AND NOT EXISTS (SELECT 1 FROM main.movimientos h WHERE h.id = mv.id AND h.arrastre = 0)")
+            params.append(consulta)
+        notas = pd.read_sql_query(f"""
+            SELECT n.id, n.fila, m.actividad, n.fecha, n.cantidad, n.delta, n.nota
+            FROM ({" UNION ALL ".join(fuentes)}) n
+            JOIN metas m ON m.fila = n.fila
+            ORDER BY n.rango
+            LIMIT ?;
+        """, conn, params=params + [limite])
+    return {"metas": metas, "notas": notas}
+
+def leer_version_ledger() -> int:
+    with get_conn() as conn:
+        return int(conn.execute("SELECT version FROM ledger_version WHERE id = 1;").fetchone()[0])
+
+@medido
+def cargar_snapshot(rango: Rango = None, tam_pagina: int = PAGINA_HISTORIAL, al: Optional[str] = None) -> Dict[str, Any]:
+    """Carga versión, metas, totales y la primera página de historial por meta.
+
+    Todo sale de una sola lectura consistente con un número fijo de consultas,
+    y ninguna recorre el ledger completo: los totales vienen de avance_por_meta
+    y cada meta aporta como máximo `tam_pagina` movimientos (los más recientes).
+    Con `rango`, historial y conteos se limitan a esas fechas y el resumen
+    agrega la columna `avance_rango`. Con `al`, avance, límite, porcentaje y
+    estado son los del cierre de ese día (el historial sigue completo).
+    """
+    conds, params = _filtro_fechas(rango)
+    conds_mv, params_mv = _filtro_fechas(rango, "mv.fecha_iso")
+    with get_conn() as conn:
+        conn.execute("BEGIN;")  # lectura consistente: versión y datos del mismo instante
+        version = conn.execute("SELECT version FROM ledger_version WHERE id = 1;").fetchone()[0]
+        metas = pd.read_sql_query(SQL_METAS, conn)
+        # arrastre: si la meta tiene saldo arrastrado del archivo (el archivado es un
+        # prefijo por id: es su primer movimiento en la tabla, una búsqueda por índice)
+        avances = pd.read_sql_query("""
+            SELECT a.fila, a.avance, a.n_movimientos,
+                   COALESCE((SELECT m.arrastre FROM movimientos m WHERE m.fila = a.fila
+                             ORDER BY m.id LIMIT 1), 0) AS arrastre
+            FROM avance_por_meta a;
+        """, conn)
+        if al:
+            avance_hist = pd.read_sql_query(SQL_AVANCE_AL, conn, params=(al,)).set_index("fila")["avance"]
+            avances["avance"] = avances["fila"].map(avance_hist).fillna(0).astype(int)
+        if rango:
+            en_rango = pd.read_sql_query(f"""
+                SELECT fila, COUNT(*) AS n_rango, SUM(delta) AS avance_rango
+                FROM movimientos
+                WHERE {" AND ".join(conds)}
+                GROUP BY fila;
+            """, conn, params=params)
+        # Primera página por meta: el corte es el id en la posición tam_pagina+1
+        # (búsqueda hacia atrás en idx_mov_fila_id) y luego un rango id >= corte.
+        # CROSS JOIN fija el orden: metas afuera, búsqueda por índice adentro.
+        filas_pag = conn.execute(f"""
+            WITH cortes AS (
+                SELECT mt.fila, COALESCE((
+                    SELECT id FROM movimientos
+                    WHERE {" AND ".join(["fila = mt.fila"] + conds)}
+                    ORDER BY id DESC LIMIT 1 OFFSET ?
+                ), 0) AS corte
+                FROM metas mt
+            )
+            SELECT mv.id, mv.fila, mv.fecha, mv.cantidad, mv.nota, mv.delta, mv.arrastre
+            FROM cortes c CROSS JOIN movimientos mv
+            WHERE {" AND ".join(["mv.fila = c.fila", "mv.id >= c.corte"] + conds_mv)}
+            ORDER BY mv.fila, mv.id DESC;
+        """, params + [tam_pagina] + params_mv).fetchall()
+        conn.commit()
+    resumen = _resumen_desde(metas, avances)
+    resumen["n_movimientos"] = resumen["fila"].map(avances.set_index("fila")["n_movimientos"]).fillna(0).astype(int)
+    resumen["arrastre"] = resumen["fila"].map(avances.set_index("fila")["arrastre"]).fillna(0).astype(int)
+    if rango:
+        en_rango = en_rango.set_index("fila")
+        resumen["n_rango"] = resumen["fila"].map(en_rango["n_rango"]).fillna(0).astype(int)
+        resumen["avance_rango"] = resumen["fila"].map(en_rango["avance_rango"]).fillna(0).astype(int)
+    historial: Dict[int, List[Dict[str, Any]]] = {}
+    for r in filas_pag:
+        historial.setdefault(int(r[1]), []).append(_mov_dict(r[0], *r[2:]))
+    hay_mas = {f: len(items) > tam_pagina for f, items in historial.items()}
+    historial = {f: items[:tam_pagina] for f, items in historial.items()}
+    return {
+        "version": int(version),
+        "rango": rango,
+        "al": al,
+        "metas": metas,
+        "resumen": resumen,
+        "historial": historial,
+        "hay_mas": hay_mas,
+    }
+
 # ==================================
 # 3) ESTADO DE UI (inputs por actividad)
 # ==================================
-if "reset_flags" not in st.session_state:
-    st.session_state["reset_flags"] = {}
-
-def set_reset_flag(fila: int, val: bool):
-    st.session_state["reset_flags"][fila] = val
-
-def get_reset_flag(fila: int) -> bool:
-    return st.session_state["reset_flags"].get(fila, False)
-
 def ensure_ui_keys_for_fila(fila: int):
-    st.session_state.setdefault(f"mov_val_{fila}", 0)
-    st.session_state.setdefault(f"nota_inline_{fila}", "")
+    st.session_state.setdefault(clave_sitio(f"mov_val_{fila}"), 0)
+    st.session_state.setdefault(clave_sitio(f"nota_inline_{fila}"), "")
+
+# Paginación keyset del historial: pila de cursores (último id visto) por fila
+def cursores_historial(fila: int) -> List[int]:
+    return st.session_state.setdefault(clave_sitio(f"hist_cursores_{fila}"), [])
+
+def pagina_mas_antigua(fila: int, ultimo_id: int):
+    cursores_historial(fila).append(ultimo_id)
+
+def pagina_mas_reciente(fila: int):
+    if cursores_historial(fila):
+        cursores_historial(fila).pop()
+
+def refrescar_version():
+    """Lee la versión del ledger una vez por ejecución: al inicio del rerun completo
+    y en el callback que acaba de escribir. Los fragmentos solo la comparan."""
+    st.session_state[clave_sitio("version_ledger")] = leer_version_ledger()
+
+def snapshot_vigente(rango: Rango, al: Optional[str]) -> Dict[str, Any]:
+    """Snapshot de la sesión; se recarga solo si cambió la versión del ledger o el filtro.
+
+    Es la dependencia de datos de todos los fragmentos: el rerun completo y
+    los parciales leen de aquí, y tras un guardado el primero que llega
+    recarga para los demás. No consulta la base salvo para recargar.
+    """
+    clave = clave_sitio("snapshot")
+    snap = st.session_state.get(clave)
+    clave_version = clave_sitio("version_ledger")
+    if clave_version not in st.session_state:
+        refrescar_version()
+    if snap is None or (snap["version"], snap["rango"], snap["al"]) != (st.session_state[clave_version], rango, al):
+        snap = cargar_snapshot(rango, al=al)
+        snap["por_fila"] = {int(r["fila"]): r for _, r in snap["resumen"].iterrows()}
+        st.session_state[clave] = snap
+        # el snapshot pudo leer una versión más nueva: es la vigente para el resto de la ejecución
+        st.session_state[clave_version] = snap["version"]
+    return snap
+
+# === FRAGMENTOS: cada bloque se vuelve a ejecutar solo (st.rerun con sus keys) ===
+def en_fragmento(fn, key: str, *args):
+    """Ejecuta `fn(*args)` como fragmento con nombre, para poder re-ejecutarlo desde un callback."""
+    return st.fragment(fn, key=key)(*args)
+
+def frag_meta(fila: int) -> str:
+    return clave_sitio(f"frag_meta_{fila}")
+
+def frag_historial(fila: int) -> str:
+    return clave_sitio(f"frag_hist_{fila}")
+
+def tras_escribir(fila: int):
+    """Después de escribir en una meta: se re-ejecutan su bloque, su historial,
+    los números del resumen, la exportación y los gráficos; el resto de la página no.
+    En carga por lote los bloques por meta no se dibujan: no se piden."""
+    claves = [frag_historial(fila), clave_sitio("frag_resumen"), clave_sitio("frag_excel"), clave_sitio("frag_graficos")]
+    if not st.session_state.get(clave_sitio("modo_lote")):
+        claves.insert(0, frag_meta(fila))
+    # el rótulo del popover es el avance: al cambiar, se reasigna para que siga abierto
+    pop = clave_sitio(f"pop_hist_{fila}")
+    if st.session_state.get(pop):
+        st.session_state[pop] = True
+    refrescar_version()
+    st.rerun(claves)
+
+def guardar_movimiento(fila: int):
+    mov = int(st.session_state[clave_sitio(f"mov_val_{fila}")])
+    nota_mov = (st.session_state[clave_sitio(f"nota_inline_{fila}")] or "").strip()
+    insertar_movimiento(fila, mov, nota_mov)
+    st.session_state[clave_sitio(f"mov_val_{fila}")] = 0
+    st.session_state[clave_sitio(f"nota_inline_{fila}")] = ""
+    tras_escribir(fila)
+
+def guardar_edicion(fila: int, id_mov: int):
+    actualizar_movimiento(id_mov, fila, int(st.session_state[clave_sitio(f"edit_cant_{fila}_{id_mov}")]),
+                          st.session_state[clave_sitio(f"edit_nota_{fila}_{id_mov}")])
+    tras_escribir(fila)
+
+def borrar_movimiento(fila: int, id_mov: int):
+    eliminar_movimiento(id_mov)
+    tras_escribir(fila)
+
+def ir_a_resultado(tipo: str):
+    """Selección en los resultados de búsqueda: el historial de esa meta queda en la página del hallazgo."""
+    filas_sel = st.session_state[clave_sitio(f"busqueda_{tipo}")].selection.rows
+    if not filas_sel:
+        return
+    hit = st.session_state[clave_sitio("busqueda_resultados")][tipo].iloc[filas_sel[0]]
+    f = int(hit["fila"])
+    # la página muestra ids < cursor: con id + 1 el movimiento encontrado queda primero
+    st.session_state[clave_sitio(f"hist_cursores_{f}")] = [int(hit["id"]) + 1] if tipo == "notas" else []
+    st.session_state[clave_sitio(f"pop_hist_{f}")] = True
+    st.session_state[clave_sitio("busqueda_destino")] = (
+        f"Historial de «{hit['actividad']}» abierto"
+        + (f" desde el movimiento del {hit['fecha']}" if tipo == "notas" else "")
+        + ": está en su **avance**, en el resumen interactivo."
+    )
+    st.rerun([frag_historial(f), clave_sitio("frag_busqueda")])
+
+def guardar_lote(filas: List[int]):
+    """Envío del formulario «Guardar todo»: un solo commit y un solo rerun (el del formulario)."""
+    entradas = []
+    for f in filas:
+        mov = int(st.session_state[clave_sitio(f"lote_mov_{f}")])
+        nota_mov = (st.session_state[clave_sitio(f"lote_nota_{f}")] or "").strip()
+        if mov or nota_mov:
+            entradas.append((f, mov, nota_mov))
+    n = insertar_movimientos_lote(entradas)
+    for f in filas:
+        st.session_state[clave_sitio(f"lote_mov_{f}")] = 0
+        st.session_state[clave_sitio(f"lote_nota_{f}")] = ""
+    st.session_state[clave_sitio("lote_reporte")] = (len(entradas), n)
 
 # =========================
 # 4) UI PRINCIPAL POR FILA
 # =========================
-df_base = obtener_metas_df()
-
-for _, r in df_base.iterrows():
-    f = int(r["fila"])
+# Filtro opcional por rango de fechas (afecta resumen, historial y Excel)
+rango_fechas: Rango = None
+if st.sidebar.checkbox("Filtrar por rango de fechas", key="filtro_fechas_on"):
+    _hoy = date.today()
+    _sel_rango = st.sidebar.date_input(
+        "Rango de fechas", value=(_hoy.replace(day=1), _hoy), format="DD-MM-YYYY", key="filtro_fechas"
+    )
+    if isinstance(_sel_rango, (list, tuple)) and len(_sel_rango) == 2:
+        rango_fechas = (_sel_rango[0].isoformat(), _sel_rango[1].isoformat())
+
+# Vista histórica: el resumen tal como estaba al cierre de una fecha
+al_fecha: Optional[str] = None
+if st.sidebar.checkbox("Ver avance a una fecha (histórico)", key="ver_al_on"):
+    _fin_mes_anterior = date.today().replace(day=1) - timedelta(days=1)
+    al_fecha = st.sidebar.date_input(
+        "Avance al", value=_fin_mes_anterior, format="DD-MM-YYYY", key="ver_al_fecha"
+    ).isoformat()
+
+# Vistas históricas (historial y Excel) con los movimientos archivados
+con_archivo = st.sidebar.checkbox("Incluir movimientos archivados", key="con_archivo",
+                                  help="Historial y Excel leen también el archivo del ledger (solo lectura).")
+
+refrescar_version()
+snap = snapshot_vigente(rango_fechas, al_fecha)
+filas_ui = [int(f) for f in snap["resumen"]["fila"]]
+
+def bloque_meta(f: int, rango: Rango, al: Optional[str]):
+    r = snapshot_vigente(rango, al)["por_fila"].get(f)
+    if r is None:
+        return
     ensure_ui_keys_for_fila(f)
 
-    if get_reset_flag(f):
-        st.session_state[f"mov_val_{f}"] = 0
-        st.session_state[f"nota_inline_{f}"] = ""
-        set_reset_flag(f, False)
-
     meta_total = int(r["meta_total"])
-    avance = int(suma_delta_por_fila(f))
+    avance = int(r["avance"])
     restante = meta_total - avance
 
     colA, colB = st.columns([2.2, 1])
     with colA:
         st.markdown(f"**{r['actividad']}**  \nMeta original: **{meta_total}**")
-        st.caption(f"Índole: {r['indole']} • Zona: {r['zona_trabajo']} • Periodicidad: {r['periodicidad']} • Indicador: {r['indicador_actividad']}")
+        zona = f" • Zona: {r['zona_trabajo']}" if SITIOS[SITIO]["mostrar_zona"] else ""
+        st.caption(f"Índole: {r['indole']}{zona} • Periodicidad: {r['periodicidad']} • Indicador: {r['indicador_actividad']}")
     with colB:
         st.metric("Límite restante", restante)
 
@@ -468,7 +1814,7 @@ for _, r in df_base.iterrows():
     with c1:
         st.number_input(
             "Movimiento",
-            key=f"mov_val_{f}",
+            key=clave_sitio(f"mov_val_{f}"),
             step=1, format="%d",
             min_value=-meta_total,
             max_value= meta_total,
@@ -477,35 +1823,142 @@ for _, r in df_base.iterrows():
     with c2:
         st.text_input(
             "Nota del movimiento (opcional)",
-            key=f"nota_inline_{f}",
+            key=clave_sitio(f"nota_inline_{f}"),
             placeholder="Breve descripción…"
         )
     with c3:
-        if st.button("Guardar movimiento", key=f"guardar_{f}"):
-            mov = int(st.session_state[f"mov_val_{f}"])
-            nota_mov = (st.session_state[f"nota_inline_{f}"] or "").strip()
-            _ = insertar_movimiento(f, mov, nota_mov)
-            set_reset_flag(f, True)
-            st.rerun()
+        st.button("Guardar movimiento", key=clave_sitio(f"guardar_{f}"), on_click=guardar_movimiento, args=(f,))
+
+    st.divider()
 
+def formulario_lote(filas: List[int]):
+    """Movimiento y nota de todas las metas; nada se envía hasta «Guardar todo»."""
+    por_fila = snap["por_fila"]
+    with st.form(clave_sitio("form_lote"), border=False):
+        for f in filas:
+            r = por_fila[f]
+            meta_total = int(r["meta_total"])
+            st.session_state.setdefault(clave_sitio(f"lote_mov_{f}"), 0)
+            st.session_state.setdefault(clave_sitio(f"lote_nota_{f}"), "")
+            c1, c2, c3 = st.columns([2.2, 1.1, 2.2])
+            with c1:
+                st.markdown(f"**{r['actividad']}**")
+                st.caption(f"Meta: {meta_total} • Límite restante: {int(r['limite_restante'])}")
+            with c2:
+                st.number_input("Movimiento", key=clave_sitio(f"lote_mov_{f}"), step=1, format="%d",
+                                min_value=-meta_total, max_value=meta_total)
+            with c3:
+                st.text_input("Nota (opcional)", key=clave_sitio(f"lote_nota_{f}"),
+                              placeholder="Breve descripción…")
+        st.form_submit_button("💾 Guardar todo", type="primary", on_click=guardar_lote, args=(filas,))
+    reporte = st.session_state.pop(clave_sitio("lote_reporte"), None)
+    if reporte is not None:
+        st.success(f"{reporte[1]} movimiento(s) registrados de {reporte[0]} entrada(s) con cambios.")
     st.divider()
 
+if st.toggle("Carga por lote (todas las metas, un solo guardado)", key=clave_sitio("modo_lote"),
+             help="Completa Movimiento y Nota de varias metas y guárdalas juntas."):
+    formulario_lote(filas_ui)
+else:
+    for f in filas_ui:
+        en_fragmento(bloque_meta, frag_meta(f), f, rango_fechas, al_fecha)
+
+# =========================
+# 4b) IMPORTACIÓN MASIVA (CSV / Excel)
+# =========================
+with st.expander("📤 Importar movimientos desde CSV / Excel"):
+    st.caption(
+        "Columnas: fila, fecha (DD-MM-YYYY, opcional), cantidad (con signo, igual que «Movimiento»), nota (opcional). "
+        "Se aplican las mismas reglas de recorte que al guardar un movimiento."
+    )
+    archivo = st.file_uploader("Archivo de movimientos", type=["csv", "xlsx"], key=clave_sitio("import_archivo"))
+    if archivo is not None and st.button("Importar movimientos", key=clave_sitio("import_btn")):
+        try:
+            reporte = importar_movimientos(leer_archivo_movimientos(archivo.name, archivo.getvalue()))
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.session_state[clave_sitio("import_reporte")] = reporte
+            st.rerun()  # toca varias metas: rerun completo
+    reporte = st.session_state.get(clave_sitio("import_reporte"))
+    if reporte is not None:
+        conteo = reporte["estado"].value_counts()
+        st.write(
+            f"Aceptadas: **{conteo.get('aceptada', 0)}** • Recortadas: **{conteo.get('recortada', 0)}** • "
+            f"Rechazadas: **{conteo.get('rechazada', 0)}**"
+        )
+        st.dataframe(reporte, use_container_width=True, hide_index=True)
+
 # =========================
 # 5) TABLA RESUMEN
 # =========================
-df = obtener_resumen_df()
-st.dataframe(
-    df[["actividad", "meta_total", "avance", "limite_restante", "porcentaje", "estado"]],
-    use_container_width=True
-)
+def numeros_resumen(vista: str, rango: Rango, al: Optional[str]):
+    """Tabla resumen ("tabla") o métrica global ("total"): un mismo fragmento en dos lugares."""
+    df = snapshot_vigente(rango, al)["resumen"]
+    if vista == "total":
+        meta_total_sum = int(df["meta_total"].sum())
+        avance_total = int(df["avance"].sum())
+        pct_total = (avance_total / meta_total_sum) * 100 if meta_total_sum else 0
+        st.metric("Avance total (todas las metas)", f"{pct_total:.1f}%")
+        return
+    cols_tabla = ["actividad", "meta_total", "avance", "limite_restante", "porcentaje", "estado"]
+    if rango:
+        cols_tabla.insert(3, "avance_rango")
+        st.caption(f"Movimientos del {rango[0]} al {rango[1]} en la columna avance_rango.")
+    if al:
+        st.info(f"Vista histórica: avance, límite, porcentaje y estado al cierre del "
+                f"{date.fromisoformat(al).strftime('%d-%m-%Y')}. Los movimientos nuevos se registran con la fecha de hoy.")
+    st.dataframe(
+        df[cols_tabla],
+        use_container_width=True
+    )
+
+en_fragmento(numeros_resumen, clave_sitio("frag_resumen"), "tabla", rango_fechas, al_fecha)
+_registrar_primer_pintado()
+
+# =========================
+# 5b) BÚSQUEDA EN NOTAS Y METAS
+# =========================
+def busqueda(con_archivo: bool):
+    texto = st.text_input("🔎 Buscar en notas y metas", key=clave_sitio("busqueda"),
+                          placeholder="K-9, Brasilito, una placa…").strip()
+    if len(texto) < 2:
+        return
+    t0 = time.perf_counter()
+    res = buscar_texto(texto, con_archivo=con_archivo)
+    ms = (time.perf_counter() - t0) * 1000
+    st.session_state[clave_sitio("busqueda_resultados")] = res
+    st.caption(f"{len(res['metas'])} meta(s) y {len(res['notas'])} nota(s) en {ms:.0f} ms "
+               f"(máx. {BUSQUEDA_MAX} por grupo) • elegí una fila para ir a su historial")
+    if not res["metas"].empty:
+        st.dataframe(
+            res["metas"][["actividad", "coincidencia"]].rename(columns={"actividad": "Meta", "coincidencia": "Coincidencia"}),
+            use_container_width=True, hide_index=True, key=clave_sitio("busqueda_metas"),
+            on_select=partial(ir_a_resultado, "metas"), selection_mode="single-row",
+        )
+    if not res["notas"].empty:
+        st.dataframe(
+            res["notas"][["actividad", "fecha", "cantidad", "nota"]]
+            .rename(columns={"actividad": "Meta", "fecha": "Fecha", "cantidad": "Cantidad", "nota": "Nota"}),
+            use_container_width=True, hide_index=True, key=clave_sitio("busqueda_notas"),
+            on_select=partial(ir_a_resultado, "notas"), selection_mode="single-row",
+        )
+    destino = st.session_state.pop(clave_sitio("busqueda_destino"), None)
+    if destino:
+        st.success(destino)
+
+en_fragmento(busqueda, clave_sitio("frag_busqueda"), con_archivo)
 
 # =========================
 # 6) BURBUJAS: VER/EDITAR/ELIMINAR HISTORIAL
 # =========================
 st.markdown("#### Resumen interactivo (clic en el **avance** para ver/editar historial)")
 
-for _, row in df.iterrows():
-    f = int(row["fila"])
+def fila_historial(f: int, rango: Rango, al: Optional[str], con_archivo: bool):
+    snap = snapshot_vigente(rango, al)
+    row = snap["por_fila"].get(f)
+    if row is None:
+        return
     c1, c2, c3, c4, c5, c6 = st.columns([4, 1.1, 1.1, 1.1, 1.2, 1.8])
     with c1:
         st.markdown(f"**{row['actividad']}**")
@@ -517,43 +1970,84 @@ for _, row in df.iterrows():
         st.write(int(row["limite_restante"]))
     with c4:
         st.caption("avance")
-        with st.popover(f"{int(row['avance'])}"):
-            st.markdown(f"**Historial — {row['actividad']}**")
-            hist = obtener_historial(f)
-            st.caption(f"Movimientos registrados: {len(hist)}")
-            if not hist:
-                st.caption("Sin movimientos registrados aún.")
-            else:
-                df_hist_view = pd.DataFrame([
-                    {"Fecha": i["fecha"], "Cantidad": i["cantidad"], "Nota": i.get("nota", "")}
-                    for i in hist
-                ])
-                st.table(df_hist_view)
-
-                st.markdown("**Editar / eliminar**")
-                for item in hist:
-                    id_mov = int(item["id"])
-                    ec1, ec2, ec3, ec4 = st.columns([1, 1, 3, 1.2])
-                    with ec1:
-                        st.text_input("Fecha", value=item["fecha"], key=f"edit_fecha_{f}_{id_mov}", disabled=True)
-                    with ec2:
-                        nueva_cant = st.number_input(
-                            "Cantidad", min_value=0, step=1,
-                            value=int(item["cantidad"]),
-                            key=f"edit_cant_{f}_{id_mov}"
-                        )
-                    with ec3:
-                        nueva_nota = st.text_input(
-                            "Nota", value=item.get("nota",""),
-                            key=f"edit_nota_{f}_{id_mov}"
-                        )
-                    with ec4:
-                        if st.button("💾 Guardar", key=f"save_edit_{f}_{id_mov}"):
-                            actualizar_movimiento(id_mov, f, int(nueva_cant), nueva_nota)
-                            st.rerun()
-                        if st.button("🗑️ Eliminar", key=f"del_{f}_{id_mov}"):
-                            eliminar_movimiento(id_mov)
-                            st.rerun()
+        # con estado: cerrado no se dibuja su contenido (historial, saldos, conteos)
+        pop = st.popover(f"{int(row['avance'])}", key=clave_sitio(f"pop_hist_{f}"), on_change="rerun")
+        if pop.open:
+            with pop:
+                st.markdown(f"**Historial — {row['actividad']}**")
+                cursores = cursores_historial(f)
+                if cursores or con_archivo:
+                    hist, hay_mas = obtener_historial_pagina(f, cursores[-1] if cursores else None, rango,
+                                                             con_archivo=con_archivo)
+                else:
+                    hist, hay_mas = snap["historial"].get(f, []), snap["hay_mas"].get(f, False)
+                arrastre = False
+                if con_archivo:
+                    total = contar_movimientos(f, rango, con_archivo=True)
+                elif rango:
+                    total = int(row["n_rango"])
+                else:  # n_movimientos cuenta la tabla caliente, con el arrastre
+                    arrastre = bool(row["arrastre"])
+                    total = int(row["n_movimientos"]) - arrastre
+                inicio = len(cursores) * PAGINA_HISTORIAL
+                st.caption(
+                    f"Movimientos registrados{' en el rango' if rango else ''}{' (con archivo)' if con_archivo else ''}"
+                    f"{' en la tabla' if arrastre else ''}: {total}{' + saldo arrastrado' if arrastre else ''}"
+                    + (f" • mostrando {inicio + 1}–{inicio + len(hist)} (más recientes primero)" if hist else "")
+                )
+                if not hist:
+                    st.caption("Sin movimientos registrados aún.")
+                else:
+                    if cursores or rango or al or con_archivo:
+                        saldos = saldos_movimientos(f, [i["id"] for i in hist], con_archivo)
+                    else:  # primera página sin filtro: los más recientes, contiguos hasta el avance actual
+                        saldos = dict(zip([i["id"] for i in hist],
+                                          accumulate([i["delta"] for i in hist[:-1]], lambda a, d: a - d,
+                                                     initial=int(row["avance"]))))
+                    df_hist_view = pd.DataFrame([
+                        {"Fecha": i["fecha"], "Cantidad": i["cantidad"], "Avance tras el movimiento": saldos.get(i["id"]),
+                         "Nota": i.get("nota", "")}
+                        for i in hist
+                    ])
+                    st.table(df_hist_view)
+
+                    editables = [] if con_archivo else [i for i in hist if not i["arrastre"]]
+                    if con_archivo:
+                        st.caption("Vista con archivo: solo lectura.")
+                    elif len(editables) < len(hist):
+                        st.caption("El saldo arrastrado resume movimientos archivados y no se edita.")
+                    if editables:
+                        st.markdown("**Editar / eliminar**")
+                    for item in editables:
+                        id_mov = int(item["id"])
+                        ec1, ec2, ec3, ec4 = st.columns([1, 1, 3, 1.2])
+                        with ec1:
+                            st.text_input("Fecha", value=item["fecha"], key=clave_sitio(f"edit_fecha_{f}_{id_mov}"), disabled=True)
+                        with ec2:
+                            st.number_input(
+                                "Cantidad", min_value=0, step=1,
+                                value=int(item["cantidad"]),
+                                key=clave_sitio(f"edit_cant_{f}_{id_mov}")
+                            )
+                        with ec3:
+                            st.text_input(
+                                "Nota", value=item.get("nota",""),
+                                key=clave_sitio(f"edit_nota_{f}_{id_mov}")
+                            )
+                        with ec4:
+                            st.button("💾 Guardar", key=clave_sitio(f"save_edit_{f}_{id_mov}"),
+                                      on_click=guardar_edicion, args=(f, id_mov))
+                            st.button("🗑️ Eliminar", key=clave_sitio(f"del_{f}_{id_mov}"),
+                                      on_click=borrar_movimiento, args=(f, id_mov))
+
+                if cursores or hay_mas:
+                    nav1, nav2 = st.columns(2)
+                    with nav1:
+                        st.button("⬅️ Más recientes", key=clave_sitio(f"hist_prev_{f}"), disabled=not cursores,
+                                  on_click=pagina_mas_reciente, args=(f,))
+                    with nav2:
+                        st.button("Más antiguos ➡️", key=clave_sitio(f"hist_next_{f}"), disabled=not hay_mas,
+                                  on_click=pagina_mas_antigua, args=(f, hist[-1]["id"] if hist else 0))
 
     with c5:
         st.caption("porcentaje")
@@ -563,109 +2057,222 @@ for _, row in df.iterrows():
         st.write(row["estado"])
     st.divider()
 
+for f in filas_ui:
+    en_fragmento(fila_historial, frag_historial(f), f, rango_fechas, al_fecha, con_archivo)
+
 # =========================
 # 7) MÉTRICA GLOBAL
 # =========================
-meta_total_sum = int(df["meta_total"].sum())
-avance_total = int(df["avance"].sum())
-pct_total = (avance_total / meta_total_sum) * 100 if meta_total_sum else 0
-st.metric("Avance total (todas las metas)", f"{pct_total:.1f}%")
+en_fragmento(numeros_resumen, clave_sitio("frag_resumen"), "total", rango_fechas, al_fecha)
 
 # =========================
 # 8) DESCARGAR EXCEL (multi-hoja, sin 'delta', con estilos)
 # =========================
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-
-buffer = BytesIO()
-
-# --- Hoja RESUMEN (igual a pantalla + contexto) ---
-df_resumen = df[[
-    "fila", "actividad", "meta_total", "avance", "limite_restante", "porcentaje", "estado"
-]].copy()
-
-# Agregar columnas de contexto
-ctx = obtener_metas_df().set_index("fila")
-for col in ["indole", "zona_trabajo", "actores", "indicador_actividad",
-            "consideraciones", "periodicidad", "responsable", "efecto_esperado"]:
-    df_resumen[col] = df_resumen["fila"].map(ctx[col])
-
-# --- Hoja HISTORIAL (1 fila por movimiento, SIN 'delta') ---
-hist_rows = []
-for _, r in df.iterrows():
-    f = int(r["fila"])
-    actividad = r["actividad"]
-    for m in obtener_historial(f):
-        hist_rows.append({
-            "fila": f,
-            "actividad": actividad,
-            "fecha": m.get("fecha", ""),
-            "cantidad": int(m.get("cantidad", 0)),
-            "nota": m.get("nota", ""),
-        })
-df_hist = pd.DataFrame(hist_rows)
-
-# --- Hoja RESPALDO (solo notas no vacías) ---
-if not df_hist.empty:
-    df_respaldo = df_hist[df_hist["nota"].astype(str).str.strip() != ""].loc[:, ["fila", "actividad", "fecha", "nota"]].copy()
-else:
-    df_respaldo = pd.DataFrame(columns=["fila", "actividad", "fecha", "nota"])
+COLS_CONTEXTO = ["indole", "zona_trabajo", "actores", "indicador_actividad",
+                 "consideraciones", "periodicidad", "responsable", "efecto_esperado"]
+UMBRAL_STREAMING = 50_000  # movimientos a partir de los cuales conviene el modo streaming
+
+def _cols_resumen_excel(resumen: pd.DataFrame) -> List[str]:
+    cols = ["fila", "actividad", "meta_total", "avance", "limite_restante", "porcentaje", "estado"]
+    if "avance_rango" in resumen.columns:
+        cols.insert(4, "avance_rango")
+    return cols
+
+def _estilo_encabezado(c):
+    from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+    thin = Side(border_style="thin", color="D0D0D0")
+    c.fill = PatternFill("solid", fgColor="1E88E5")  # azul
+    c.font = Font(color="FFFFFF", bold=True)
+    c.alignment = Alignment(horizontal="center", vertical="center")
+    c.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+def _ancho_columna(titulo) -> int:
+    return max(12, min(60, len(str(titulo)) + 6))
 
 def estilizar_hoja(ws, hex_tab):
+    from openpyxl.utils import get_column_letter
     # Color de pestaña
     ws.sheet_properties.tabColor = hex_tab
     # Estilos de encabezado
-    header_fill = PatternFill("solid", fgColor="1E88E5")  # azul
-    header_font = Font(color="FFFFFF", bold=True)
-    align_center = Alignment(horizontal="center", vertical="center")
-    thin = Side(border_style="thin", color="D0D0D0")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
     for col in range(1, ws.max_column + 1):
         c = ws.cell(row=1, column=col)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = align_center
-        c.border = border
-        ws.column_dimensions[get_column_letter(col)].width = max(12, min(60, len(str(c.value)) + 6))
+        _estilo_encabezado(c)
+        ws.column_dimensions[get_column_letter(col)].width = _ancho_columna(c.value)
     ws.freeze_panes = "A2"
 
-with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-    df_resumen.to_excel(writer, index=False, sheet_name="Resumen")
+# El libro se arma solo cuando alguien pulsa "Descargar" y se cachea por
+# versión del ledger (+ contenido de metas): descargas repetidas sin cambios
+# salen de la caché, en cualquier sesión.
+@st.cache_data(max_entries=8, show_spinner=False)
+@medido
+def excel_desglose(sitio: str, version: int, rango: Rango, al: Optional[str], metas: pd.DataFrame,
+                   _resumen: pd.DataFrame, con_archivo: bool = False) -> bytes:
+    importar_perezoso("openpyxl.styles")
+    ledger = leer_ledger_df(_rango_hasta(rango, al), con_archivo)
+    # --- Hoja RESUMEN (igual a pantalla + contexto) ---
+    df_resumen = _resumen[_cols_resumen_excel(_resumen)].copy()
+
+    # Agregar columnas de contexto
+    ctx = metas.set_index("fila")
+    for col in COLS_CONTEXTO:
+        df_resumen[col] = df_resumen["fila"].map(ctx[col])
+
+    # --- Hoja HISTORIAL (1 fila por movimiento, SIN 'delta') ---
+    df_hist = ledger.merge(_resumen[["fila", "actividad"]], on="fila", how="left")
+    df_hist = df_hist.loc[:, ["fila", "actividad", "fecha", "cantidad", "nota"]]
+
+    # --- Hoja RESPALDO (solo notas no vacías) ---
     if not df_hist.empty:
-        df_hist.to_excel(writer, index=False, sheet_name="Historial")
-    if not df_respaldo.empty:
-        df_respaldo.to_excel(writer, index=False, sheet_name="Respaldo (notas)")
-
-    # Aplicar colores a pestañas + encabezados
-    if "Resumen" in writer.sheets:
-        estilizar_hoja(writer.sheets["Resumen"], "1E88E5")      # azul
-    if "Historial" in writer.sheets:
-        estilizar_hoja(writer.sheets["Historial"], "E53935")    # rojo
-    if "Respaldo (notas)" in writer.sheets:
-        estilizar_hoja(writer.sheets["Respaldo (notas)"], "43A047")  # verde
-
-buffer.seek(0)
-st.download_button(
-    "📥 Descargar desglose en Excel",
-    buffer,
-    file_name="avance_por_meta_movimientos.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-)
+        df_respaldo = df_hist[df_hist["nota"].astype(str).str.strip() != ""].loc[:, ["fila", "actividad", "fecha", "nota"]].copy()
+    else:
+        df_respaldo = pd.DataFrame(columns=["fila", "actividad", "fecha", "nota"])
+
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        df_resumen.to_excel(writer, index=False, sheet_name="Resumen")
+        if not df_hist.empty:
+            df_hist.to_excel(writer, index=False, sheet_name="Historial")
+        if not df_respaldo.empty:
+            df_respaldo.to_excel(writer, index=False, sheet_name="Respaldo (notas)")
+
+        # Aplicar colores a pestañas + encabezados
+        if "Resumen" in writer.sheets:
+            estilizar_hoja(writer.sheets["Resumen"], "1E88E5")      # azul
+        if "Historial" in writer.sheets:
+            estilizar_hoja(writer.sheets["Historial"], "E53935")    # rojo
+        if "Respaldo (notas)" in writer.sheets:
+            estilizar_hoja(writer.sheets["Respaldo (notas)"], "43A047")  # verde
+    return buffer.getvalue()
+
+# --- Modo streaming: workbook write-only alimentado por cursores (memoria constante) ---
+SQL_HIST_STREAM = """
+    SELECT m.fila, mt.actividad, m.fecha, m.cantidad, COALESCE(m.nota, '') AS nota
+    FROM {fuente} m LEFT JOIN metas mt ON mt.fila = m.fila
+    {where}
+    ORDER BY m.fila, m.id;
+"""
+
+def _filas_cursor(cur, tam_lote: int = 5000):
+    while True:
+        lote = cur.fetchmany(tam_lote)
+        if not lote:
+            return
+        yield from lote
+
+def _hoja_streaming(wb, titulo: str, hex_tab: str, columnas: List[str], filas) -> int:
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    ws = wb.create_sheet(titulo)
+    ws.sheet_properties.tabColor = hex_tab
+    ws.freeze_panes = "A2"
+    encabezado = []
+    for i, col in enumerate(columnas, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = _ancho_columna(col)
+        c = WriteOnlyCell(ws, value=col)
+        _estilo_encabezado(c)
+        encabezado.append(c)
+    ws.append(encabezado)
+    n = 0
+    for fila in filas:
+        ws.append(fila)
+        n += 1
+    return n
+
+@st.cache_resource
+def _stats_export(sitio: str) -> Dict[str, Any]:
+    return {}
+
+@st.cache_data(max_entries=4, show_spinner=False)
+@medido
+def excel_desglose_streaming(sitio: str, version: int, rango: Rango, al: Optional[str], metas: pd.DataFrame,
+                             _resumen: pd.DataFrame, con_archivo: bool = False) -> bytes:
+    t0 = time.perf_counter()
+    Workbook = importar_perezoso("openpyxl").Workbook
+    importar_perezoso("openpyxl.styles")
+    wb = Workbook(write_only=True)
+    df_resumen = _resumen[_cols_resumen_excel(_resumen)].merge(metas[["fila"] + COLS_CONTEXTO], on="fila", how="left")
+    n = _hoja_streaming(wb, "Resumen", "1E88E5", list(df_resumen.columns),
+                        df_resumen.itertuples(index=False, name=None))
+    conds, params = _filtro_fechas(_rango_hasta(rango, al), "m.fecha_iso")
+    conds_notas = conds + ["TRIM(COALESCE(m.nota, '')) <> ''"]
+    where = "WHERE " + " AND ".join(conds) if conds else ""
+    where_notas = "WHERE " + " AND ".join(conds_notas)
+    fuente = _fuente_movimientos(con_archivo)
+    with get_conn() as conn:
+        conn.execute("BEGIN;")
+        cur = conn.cursor()
+        if cur.execute(f"SELECT 1 FROM {fuente} m {where} LIMIT 1;", params).fetchone():
+            cur.execute(SQL_HIST_STREAM.format(fuente=fuente, where=where), params)
+            n += _hoja_streaming(wb, "Historial", "E53935",
+                                 ["fila", "actividad", "fecha", "cantidad", "nota"], _filas_cursor(cur))
+        if cur.execute(f"SELECT 1 FROM {fuente} m {where_notas} LIMIT 1;", params).fetchone():
+            cur.execute(SQL_HIST_STREAM.format(fuente=fuente, where=where_notas), params)
+            n += _hoja_streaming(wb, "Respaldo (notas)", "43A047", ["fila", "actividad", "fecha", "nota"],
+                                 ((f, a, fe, nota) for f, a, fe, _, nota in _filas_cursor(cur)))
+        buffer = BytesIO()
+        wb.save(buffer)
+        conn.commit()
+    seg = time.perf_counter() - t0
+    _stats_export(sitio).update({"filas": n, "segundos": round(seg, 3), "filas_por_seg": round(n / seg) if seg else n})
+    return buffer.getvalue()
+
+def exportar_excel(rango: Rango, al: Optional[str], con_archivo: bool):
+    snap = snapshot_vigente(rango, al)
+    modo_streaming = st.toggle(
+        "Exportación en streaming (ledgers grandes)",
+        value=int(snap["resumen"]["n_movimientos"].sum()) >= UMBRAL_STREAMING,
+        help="Escribe el Excel fila a fila desde la base, con memoria constante.",
+        key="excel_streaming",
+    )
+    if modo_streaming:
+        generar_excel = partial(excel_desglose_streaming, SITIO, snap["version"], snap["rango"], snap["al"], snap["metas"], snap["resumen"], con_archivo)
+    else:
+        generar_excel = partial(excel_desglose, SITIO, snap["version"], snap["rango"], snap["al"], snap["metas"], snap["resumen"], con_archivo)
+    st.download_button(
+        "📥 Descargar desglose en Excel",
+        con_medidor(generar_excel),
+        file_name=f"avance_por_meta_movimientos_{SITIO}{'_al_' + al if al else ''}{'_con_archivo' if con_archivo else ''}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore",
+    )
+    if modo_streaming and _stats_export(SITIO):
+        ult = _stats_export(SITIO)
+        st.caption(f"Última exportación streaming: {ult['filas']} filas en {ult['segundos']} s "
+                   f"({ult['filas_por_seg']} filas/s)")
+    with st.expander("🔄 Solo cambios desde una marca (sincronización incremental)"):
+        with get_conn() as conn:
+            marca_actual = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios_movimientos;").fetchone()[0]
+        c1, c2 = st.columns(2)
+        marca = c1.number_input("Marca (seq) de la última sincronización", min_value=0, step=1,
+                                key=clave_sitio("cambios_marca"))
+        formato = c2.radio("Formato", ["csv", "ndjson"], horizontal=True, key=clave_sitio("cambios_formato"))
+        st.download_button(
+            f"📥 Descargar cambios ({formato.upper()})",
+            con_medidor(lambda: exportar_cambios(int(marca), formato)[0]),
+            file_name=f"cambios_{SITIO}_desde_{int(marca)}.{formato}",
+            mime="text/csv" if formato == "csv" else "application/x-ndjson",
+            on_click="ignore",
+        )
+        st.caption(f"Marca actual: {marca_actual}. La nueva marca es el `seq` de la última fila descargada "
+                   f"(hasta {CAMBIOS_MAX:,} movimientos por descarga); los borrados llegan con op = delete.")
+
+en_fragmento(exportar_excel, clave_sitio("frag_excel"), rango_fechas, al_fecha, con_archivo)
 
 # =========================
 # 9) 📊 Visualizaciones por meta (ocultas hasta seleccionar)
 # =========================
 st.markdown("### 📊 Visualizaciones por meta")
 
-import matplotlib.pyplot as plt
-import numpy as np
+def _plt():
+    if "matplotlib.pyplot" not in sys.modules:
+        importar_perezoso("matplotlib").use("Agg")
+    return importar_perezoso("matplotlib.pyplot")
 
 BLUE = "#1E88E5"
 RED  = "#E53935"
 
 def _prep_fig():
-    fig, ax = plt.subplots(figsize=(8, 4.5), facecolor="black")
+    fig, ax = _plt().subplots(figsize=(8, 4.5), facecolor="black")
     ax.set_facecolor("black")
     ax.tick_params(colors="white")
     ax.spines["bottom"].set_color("white")
@@ -675,93 +2282,419 @@ def _prep_fig():
     ax.grid(axis="y", alpha=0.15, color="white")
     return fig, ax
 
-# 🔽 Nuevo helper: descarga el gráfico actual como PNG (300 dpi)
-def _download_png(fig, base_name: str, key_suffix: str):
+@medido
+def _png(fig, dpi: int) -> bytes:
     img_bytes = BytesIO()
     fig.savefig(
         img_bytes,
         format="png",
-        dpi=300,
+        dpi=dpi,
         bbox_inches="tight",
         facecolor=fig.get_facecolor()  # respeta el fondo negro
     )
-    img_bytes.seek(0)
+    return img_bytes.getvalue()
+
+@medido
+def _fig_barras(actividad: str, meta: int, avance: int, restante: int, pct: float):
+    fig, ax = _prep_fig()
+    vals = [avance, restante]
+    labels = ["Avance", "Restante"]
+    x = importar_perezoso("numpy").arange(len(labels))
+    width = 0.6
+    ax.bar(x + 0.03, vals, width=width, color="black", alpha=0.35, zorder=0)  # sombra
+    bars = ax.bar(x, vals, width=width, color=[BLUE, RED], alpha=0.95, edgecolor="white", linewidth=1.2, zorder=1)
+    y_max = max(meta, max(vals), 1)
+    ax.set_ylim(0, y_max * 1.15)
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels, color="white")
+    ax.set_ylabel("Cantidad", color="white")
+    ax.set_title(f"{actividad} — Meta {meta}  |  Avance total: {pct:.1f}%", color="white")
+    for b, val in zip(bars, vals):
+        perc = (val / meta * 100) if meta else 0.0
+        ax.text(b.get_x() + b.get_width()/2, b.get_height() + (y_max * 0.03),
+                f"{val}  ({perc:.1f}%)", ha="center", va="bottom", color="white", fontsize=10)
+    return fig
+
+@medido
+def _fig_circular(actividad: str, meta: int, avance: int, restante: int, pct: float):
+    fig, ax = _prep_fig()
+    datos = [max(avance, 0), max(restante, 0)]
+    etiquetas = ["Avance", "Restante"]
+    if sum(datos) == 0:
+        datos, etiquetas = [1], ["Sin datos"]
+    wedges, texts, autotexts = ax.pie(
+        datos, labels=etiquetas, autopct=lambda p: f"{p:.1f}%", startangle=90,
+        colors=[BLUE, RED], shadow=True, wedgeprops=dict(edgecolor="white", linewidth=1.2)
+    )
+    for t in texts + autotexts:
+        t.set_color("white")
+    ax.axis("equal")
+    ax.set_title(f"{actividad} — Meta {meta}  |  Avance total: {pct:.1f}%", color="white")
+    return fig
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def serie_burnup(sitio: str, version: int) -> pd.DataFrame:
+    """Series burn-up de todas las metas; se recalculan solo si cambia el ledger."""
+    return leer_burnup_df()
+
+def _escalon_hasta_hoy(serie: pd.DataFrame) -> Tuple[Any, Any]:
+    """Fechas/valores con un punto inicial en 0 y el último valor extendido a hoy."""
+    hoy = pd.Timestamp(date.today())
+    fechas = [serie["fecha"].iloc[0]] + serie["fecha"].tolist()
+    valores = [0] + serie["acumulado"].tolist()
+    if fechas[-1] < hoy:
+        fechas.append(hoy)
+        valores.append(valores[-1])
+    return fechas, valores
+
+@medido
+def _fig_burnup(actividad: str, meta: int, serie: pd.DataFrame):
+    fig, ax = _prep_fig()
+    if serie.empty:
+        ax.text(0.5, 0.5, "Sin movimientos", ha="center", va="center", color="white", transform=ax.transAxes)
+    else:
+        fechas, valores = _escalon_hasta_hoy(serie)
+        ax.step(fechas, valores, where="post", color=BLUE, linewidth=2, label="Avance acumulado")
+        ax.fill_between(fechas, valores, step="post", color=BLUE, alpha=0.25)
+        fig.autofmt_xdate()
+    ax.axhline(meta, color=RED, linestyle="--", linewidth=1.5, label=f"Meta {meta}")
+    ax.set_ylim(0, max(meta, int(serie["acumulado"].max()) if not serie.empty else 0, 1) * 1.15)
+    ax.set_ylabel("Cantidad", color="white")
+    ax.set_title(f"{actividad} — Burn-up", color="white")
+    ax.legend(facecolor="black", labelcolor="white", loc="upper left")
+    return fig
+
+@medido
+def _fig_burnup_todas(metas: pd.DataFrame, series: pd.DataFrame):
+    """Todas las metas superpuestas, en % de su propia meta (escalas comparables)."""
+    fig, ax = _prep_fig()
+    meta_por_fila = dict(zip(metas["fila"], metas["meta_total"]))
+    for fila, serie in series.groupby("fila", sort=True):
+        meta = meta_por_fila.get(fila) or 0
+        if not meta:
+            continue
+        fechas, valores = _escalon_hasta_hoy(serie)
+        ax.step(fechas, [v / meta * 100 for v in valores], where="post", linewidth=1.5, label=f"Meta {fila}")
+    ax.axhline(100, color="white", linestyle="--", linewidth=1, alpha=0.6)
+    ax.set_ylabel("% de la meta", color="white")
+    ax.set_title("Burn-up de todas las metas", color="white")
+    if ax.get_legend_handles_labels()[0]:
+        ax.legend(facecolor="black", labelcolor="white", fontsize=8, ncol=2, loc="upper left")
+        fig.autofmt_xdate()
+    return fig
+
+class CacheGraficos:
+    """LRU de gráficos por (sitio, fila, tipo, meta, avance[, versión]).
+
+    Guarda la figura y su PNG a resolución de pantalla; el PNG de 300 dpi se
+    rasteriza recién la primera vez que alguien lo descarga.
+    """
+    DPI_PANTALLA = 100
+    DPI_DESCARGA = 300
+
+    def __init__(self, max_items: int = 32):
+        self.max_items = max_items
+        self._items: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _item(self, clave: tuple, construir) -> Dict[str, Any]:
+        """Entrada de `clave` (la construye si no está); el llamador la conserva aunque se desaloje."""
+        with self._lock:
+            item = self._items.get(clave)
+            if item is not None:
+                self._items.move_to_end(clave)
+                return item
+            fig = construir()
+            _plt().close(fig)  # fuera del estado global de pyplot; savefig sigue funcionando
+            item = {"fig": fig, "pantalla": _png(fig, self.DPI_PANTALLA), "descarga": None,
+                    "lock": threading.Lock()}
+            self._items[clave] = item
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+            return item
+
+    def pantalla(self, clave: tuple, construir) -> bytes:
+        return self._item(clave, construir)["pantalla"]
+
+    def descarga(self, clave: tuple, construir) -> bytes:
+        item = self._item(clave, construir)  # reconstruye si se desalojó entre el rerun y el clic
+        with item["lock"]:  # los 300 dpi sin bloquear el resto del caché
+            if item["descarga"] is None:
+                item["descarga"] = _png(item["fig"], self.DPI_DESCARGA)
+            return item["descarga"]
+
+@st.cache_resource
+def _cache_graficos() -> CacheGraficos:
+    return CacheGraficos()
+
+# 🔽 Descarga PNG (300 dpi) generada solo al pulsar el botón
+def _download_png(clave: tuple, construir, base_name: str, key_suffix: str):
     st.download_button(
         "📷 Descargar gráfico (PNG)",
-        data=img_bytes,
+        data=con_medidor(partial(_cache_graficos().descarga, clave, construir)),
         file_name=f"{base_name}.png",
         mime="image/png",
-        key=f"dl_{key_suffix}"
+        key=clave_sitio(f"dl_{key_suffix}"),
+        on_click="ignore",
     )
 
-_df_opts = df[["fila", "actividad", "meta_total", "avance", "limite_restante", "porcentaje_val"]].copy()
-_df_opts["op"] = _df_opts["fila"].astype(str) + " — " + _df_opts["actividad"]
-placeholder = "— Selecciona una meta —"
-options = [placeholder] + _df_opts["op"].tolist()
-sel = st.selectbox("Elegí la meta a visualizar", options, index=0, key="sel_meta_uno")
-
-if sel == placeholder:
-    st.info("Seleccioná una meta para mostrar el gráfico.")
-else:
-    fila_sel = int(_df_opts.loc[_df_opts["op"] == sel, "fila"].iloc[0])
-    row_sel = df.loc[df["fila"] == fila_sel].iloc[0]
-
-    meta = int(row_sel["meta_total"])
-    avance = int(row_sel["avance"])
-    restante = max(0, meta - avance)
-    pct = float(row_sel["porcentaje_val"])
-
-    tipo = st.radio("Tipo de gráfico", ["Barras", "Circular"], index=0, horizontal=True, key="tipo_uno_por_uno")
-
-    if tipo == "Barras":
-        fig, ax = _prep_fig()
-        vals = [avance, restante]
-        labels = ["Avance", "Restante"]
-        x = np.arange(len(labels))
-        width = 0.6
-        ax.bar(x + 0.03, vals, width=width, color="black", alpha=0.35, zorder=0)  # sombra
-        bars = ax.bar(x, vals, width=width, color=[BLUE, RED], alpha=0.95, edgecolor="white", linewidth=1.2, zorder=1)
-        y_max = max(meta, max(vals), 1)
-        ax.set_ylim(0, y_max * 1.15)
-        ax.set_xticks(x)
-        ax.set_xticklabels(labels, color="white")
-        ax.set_ylabel("Cantidad", color="white")
-        ax.set_title(f"{row_sel['actividad']} — Meta {meta}  |  Avance total: {pct:.1f}%", color="white")
-        for b, val in zip(bars, vals):
-            perc = (val / meta * 100) if meta else 0.0
-            ax.text(b.get_x() + b.get_width()/2, b.get_height() + (y_max * 0.03),
-                    f"{val}  ({perc:.1f}%)", ha="center", va="bottom", color="white", fontsize=10)
-
-        # ⬇️ Descarga PNG del gráfico actual
-        base_name = f"santacruz_meta{fila_sel}_barras_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        _download_png(fig, base_name, key_suffix=f"{fila_sel}_barras")
-
-        st.pyplot(fig, clear_figure=True)
-
-    elif tipo == "Circular":
-        fig, ax = _prep_fig()
-        datos = [max(avance, 0), max(restante, 0)]
-        etiquetas = ["Avance", "Restante"]
-        if sum(datos) == 0:
-            datos, etiquetas = [1], ["Sin datos"]
-        wedges, texts, autotexts = ax.pie(
-            datos, labels=etiquetas, autopct=lambda p: f"{p:.1f}%", startangle=90,
-            colors=[BLUE, RED], shadow=True, wedgeprops=dict(edgecolor="white", linewidth=1.2)
-        )
-        for t in texts + autotexts:
-            t.set_color("white")
-        ax.axis("equal")
-        ax.set_title(f"{row_sel['actividad']} — Meta {meta}  |  Avance total: {pct:.1f}%", color="white")
+def graficos(rango: Rango, al: Optional[str]):
+    snap = snapshot_vigente(rango, al)
+    df_opts = snap["resumen"][["fila", "actividad", "meta_total", "avance", "limite_restante", "porcentaje_val"]].copy()
+    df_opts["op"] = df_opts["fila"].astype(str) + " — " + df_opts["actividad"]
+    placeholder = "— Selecciona una meta —"
+    opcion_todas = "📈 Todas las metas (burn-up)"
+    options = [placeholder, opcion_todas] + df_opts["op"].tolist()
+    sel = st.selectbox("Elegí la meta a visualizar", options, index=0, key=clave_sitio("sel_meta_uno"))
+
+    if sel == placeholder:
+        st.info("Seleccioná una meta para mostrar el gráfico.")
+    elif sel == opcion_todas:
+        series = serie_burnup(SITIO, snap["version"])
+        construir = partial(_fig_burnup_todas, snap["metas"][["fila", "meta_total"]], series)
+        clave = (SITIO, "todas", "Burn-up", snap["version"])
+        base_name = f"{SITIO.replace('_', '')}_burnup_todas_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        _download_png(clave, construir, base_name, key_suffix="todas_burnup")
+        st.image(_cache_graficos().pantalla(clave, construir))
+    else:
+        fila_sel = int(df_opts.loc[df_opts["op"] == sel, "fila"].iloc[0])
+        row_sel = snap["por_fila"][fila_sel]
+
+        meta = int(row_sel["meta_total"])
+        avance = int(row_sel["avance"])
+        restante = max(0, meta - avance)
+        pct = float(row_sel["porcentaje_val"])
+
+        tipo = st.radio("Tipo de gráfico", ["Barras", "Circular", "Burn-up"], index=0, horizontal=True, key="tipo_uno_por_uno")
+
+        if tipo == "Burn-up":
+            series = serie_burnup(SITIO, snap["version"])
+            construir = partial(_fig_burnup, row_sel["actividad"], meta, series[series["fila"] == fila_sel])
+            clave = (SITIO, fila_sel, tipo, meta, snap["version"])
+        else:
+            dibujar = _fig_barras if tipo == "Barras" else _fig_circular
+            construir = partial(dibujar, row_sel["actividad"], meta, avance, restante, pct)
+            clave = (SITIO, fila_sel, tipo, meta, avance)
+        sufijo = {"Barras": "barras", "Circular": "circular", "Burn-up": "burnup"}[tipo]
 
         # ⬇️ Descarga PNG del gráfico actual
-        base_name = f"santacruz_meta{fila_sel}_circular_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        _download_png(fig, base_name, key_suffix=f"{fila_sel}_circular")
-
-        st.pyplot(fig, clear_figure=True)
-
-
+        base_name = f"{SITIO.replace('_', '')}_meta{fila_sel}_{sufijo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        _download_png(clave, construir, base_name, key_suffix=f"{fila_sel}_{sufijo}")
 
+        st.image(_cache_graficos().pantalla(clave, construir))
 
+en_fragmento(graficos, clave_sitio("frag_graficos"), rango_fechas, al_fecha)
 
+# =========================
+# 10) DIAGNÓSTICO: POOL DE CONEXIONES, ARRANQUE Y RENDIMIENTO
+# =========================
+with st.sidebar.expander("🔌 Conexiones DB"):
+    st.json(_pool(DB_PATH, ESQUEMA_VERSION).metricas())
+with st.sidebar.expander("✍️ Cola de escritura"):
+    st.json(_escritor(DB_PATH).metricas())
+with st.sidebar.expander("⏱️ Arranque"):
+    st.json(_tiempos_arranque())
+with st.sidebar.expander("🧾 Checkpoints del ledger"):
+    with get_conn() as conn:
+        n_cp, ultimo_cp = conn.execute("SELECT COUNT(*), COALESCE(MAX(id_corte), 0) FROM ledger_checkpoints;").fetchone()
+        ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM movimientos;").fetchone()[0]
+    st.caption(f"{n_cp} checkpoints (cada {CHECKPOINT_CADA} ids) • cola desde el último: {ultimo_id - ultimo_cp} movimientos")
+    if st.button("Verificar totales", key=clave_sitio("verificar_avances")):
+        difs = verificar_avances()
+        if difs.empty:
+            st.success("avance_por_meta coincide con checkpoint + cola.")
+        else:
+            st.warning(f"{len(difs)} meta(s) con totales desalineados.")
+            st.dataframe(difs, use_container_width=True, hide_index=True)
+            st.button("Reparar desde el ledger", key=clave_sitio("reparar_avances"), on_click=reparar_avances)
+def ejecutar_archivado():
+    st.session_state[clave_sitio("archivo_reporte")] = archivar_movimientos(
+        st.session_state[clave_sitio("archivo_corte")].isoformat(),
+        st.session_state[clave_sitio("archivo_completas")],
+    )
 
+with st.sidebar.expander("🗄️ Archivo del ledger"):
+    rep_arch = st.session_state.pop(clave_sitio("archivo_reporte"), None)
+    # a pedido (o tras archivar): cuenta ambas tablas y lee el archivo, no en cada rerun
+    if st.button("Ver estado del archivo", key=clave_sitio("archivo_estado_btn")) or rep_arch is not None:
+        arch = estado_archivo()
+        st.caption(f"{arch['en_tabla']} movimientos en la tabla ({arch['arrastres']} de arrastre) • "
+                   f"{arch['archivados']} archivados ({arch['archivo_mb']} MB)")
+    st.date_input("Archivar movimientos anteriores al", value=date.today().replace(day=1),
+                  format="DD-MM-YYYY", key=clave_sitio("archivo_corte"))
+    st.checkbox("Archivar también las metas completas", key=clave_sitio("archivo_completas"))
+    st.button("Archivar", key=clave_sitio("archivo_btn"), on_click=ejecutar_archivado)
+    if rep_arch is not None:
+        st.success(f"{rep_arch['archivados']} movimiento(s) de {rep_arch['filas']} meta(s) pasaron al archivo.")
+with st.sidebar.expander("🩺 Rendimiento por rerun"):
+    st.toggle("Medir cada rerun", key="perf_activo",
+              help="También se activa con ?perf=1 o la variable de entorno AVANCES_PERF=1.")
+    if _PERF.medidor is None:
+        st.caption("Instrumentación apagada.")
+    else:
+        resumen_perf = _PERF.medidor.cerrar()
+        historial_perf = st.session_state.setdefault("perf_historial", deque(maxlen=10))
+        historial_perf.appendleft({k: resumen_perf[k] for k in ("sitio", "rerun_ms", "consultas")})
+        c1, c2 = st.columns(2)
+        c1.metric("Rerun (ms)", f"{resumen_perf['rerun_ms']:.0f}")
+        c2.metric("Consultas SQL", resumen_perf["consultas"])
+        if resumen_perf["funciones"]:
+            st.dataframe(
+                pd.DataFrame.from_dict(resumen_perf["funciones"], orient="index")
+                .rename_axis("función").sort_values("ms", ascending=False),
+                use_container_width=True,
+            )
+        st.caption("Últimos reruns")
+        st.dataframe(pd.DataFrame(list(historial_perf)), use_container_width=True, hide_index=True)
 
+# =========================
+# 11) API JSON DE SOLO LECTURA (opcional: AVANCES_API_PORT)
+# =========================
+# Para herramientas que consultan el avance sin ejecutar la página completa.
+# Corre en el mismo proceso (mismo pool y cachés) y usa estas mismas funciones:
+#   GET /resumen?sitio=...[&al=YYYY-MM-DD]
+#   GET /metas/{fila}/historial?sitio=...&desde=YYYY-MM-DD&hasta=YYYY-MM-DD[&tam=N&antes_de=ID][&archivo=1]
+#   GET /export.xlsx?sitio=...[&al=YYYY-MM-DD][&archivo=1]
+#   GET /cambios?sitio=...&desde=SEQ[&formato=csv|ndjson][&limite=N]
+#       Movimientos con altas, cambios o bajas (lápidas) después de la marca SEQ;
+#       la nueva marca va en X-Marca y X-Hay-Mas indica si falta otra página.
+# El ETag es la versión del ledger (más el hash del plan y de la ruta con sus
+# parámetros ordenados): si no cambió, If-None-Match devuelve 304 sin consultar
+# más que esa versión.
+_log_api = logging.getLogger("avances.api")
+
+class ServidorAPI:
+    def __init__(self, host: str, puerto: int):
+        self.capa: Dict[str, Any] = {}
+        servidor = self
+        http_server = importar_perezoso("http.server")
+        urllib_parse = importar_perezoso("urllib.parse")
+
+        class Manejador(http_server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib_parse.urlsplit(self.path)
+                qs = {k: v[-1] for k, v in urllib_parse.parse_qs(url.query).items()}
+                try:
+                    servidor.responder(self, url.path.rstrip("/") or "/", qs)
+                except ValueError as e:
+                    self._enviar(400, {"error": str(e)})
+                except Exception as e:  # no tumbar el hilo del servidor
+                    _log_api.exception("error en %s", self.path)
+                    self._enviar(500, {"error": type(e).__name__})
+
+            def _enviar(self, codigo: int, cuerpo=None, etag: Optional[str] = None,
+                        tipo: str = "application/json; charset=utf-8", encabezados: Optional[Dict[str, str]] = None):
+                datos = b""
+                if isinstance(cuerpo, bytes):
+                    datos = cuerpo
+                elif cuerpo is not None:
+                    datos = cuerpo.encode("utf-8") if isinstance(cuerpo, str) else json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+                self.send_response(codigo)
+                if etag:
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", "no-cache")
+                for nombre, valor in (encabezados or {}).items():
+                    self.send_header(nombre, valor)
+                if codigo != 304:
+                    self.send_header("Content-Type", tipo)
+                    self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                if codigo != 304:
+                    self.wfile.write(datos)
+
+            def log_message(self, formato, *args):
+                pass  # sin una línea por request en la consola de Streamlit
+
+        self.httpd = http_server.ThreadingHTTPServer((host, puerto), Manejador)
+        self.httpd.daemon_threads = True
+        self.hilo = threading.Thread(target=self.httpd.serve_forever, name="avances-api", daemon=True)
+        self.hilo.start()
+
+    def responder(self, req, ruta: str, qs: Dict[str, str]):
+        capa = self.capa
+        sitio = qs.get("sitio", SITIO_POR_DEFECTO)
+        if sitio not in SITIOS:
+            return req._enviar(404, {"error": f"sitio desconocido: {sitio}"})
+        partes = ruta.strip("/").split("/")
+        if ruta == "/resumen":
+            recurso = "resumen"
+        elif ruta == "/export.xlsx":
+            recurso = "export"
+        elif ruta == "/cambios":
+            recurso = "cambios"
+        elif len(partes) == 3 and partes[0] == "metas" and partes[2] == "historial" and partes[1].isdigit():
+            recurso = "historial"
+        else:
+            return req._enviar(404, {"error": "ruta desconocida"})
+        if recurso == "cambios":
+            # parámetros con sus valores por defecto: sin `desde` y `desde=0` son la misma
+            # consulta (mismo ETag) y una marca distinta es siempre otro ETag
+            qs = {"sitio": sitio, "desde": str(int(qs.get("desde", 0))), "formato": qs.get("formato", "ndjson"),
+                  "limite": str(min(max(int(qs.get("limite", CAMBIOS_MAX)), 1), CAMBIOS_MAX))}
+
+        cfg = SITIOS[sitio]
+        plan_hash = capa["_hash_plan"]([capa["_fila_plan"](it) for it in cfg["plan"]])
+        _SITIO_HILO.db_path = cfg["db_path"]
+        try:
+            capa["_db_inicializada"](cfg["db_path"], ESQUEMA_VERSION, plan_hash, cfg["plan"], cfg["sincronizar_plan"])
+            version = capa["leer_version_ledger"]()
+            # otra página, fecha o cursor es otra respuesta: la consulta entra en el ETag
+            consulta = json.dumps([ruta, sorted((k, v) for k, v in qs.items() if k != "sitio")])
+            huella = hashlib.sha256(consulta.encode("utf-8")).hexdigest()[:12]
+            etag_de = lambda v: f'"{sitio}-{v}-{plan_hash[:12]}-{huella}"'
+            etag = etag_de(version)
+            if req.headers.get("If-None-Match") == etag:
+                return req._enviar(304, etag=etag)
+            al = date.fromisoformat(qs["al"]).isoformat() if "al" in qs else None
+            con_archivo = qs.get("archivo") == "1"
+            if recurso == "resumen":
+                snap = capa["cargar_snapshot"](tam_pagina=0, al=al)
+                cuerpo = snap["resumen"].drop(columns=["porcentaje"]).to_json(orient="records", force_ascii=False)
+                return req._enviar(200, f'{{"sitio": "{sitio}", "version": {snap["version"]}, "al": {json.dumps(al)}, "metas": {cuerpo}}}',
+                                   etag=etag_de(snap["version"]))
+            if recurso == "export":
+                snap = capa["cargar_snapshot"](tam_pagina=0, al=al)
+                xlsx = capa["excel_desglose"](sitio, snap["version"], None, al, snap["metas"], snap["resumen"], con_archivo)
+                return req._enviar(200, xlsx, etag=etag_de(snap["version"]),
+                                   tipo="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            if recurso == "cambios":
+                formato = qs["formato"]
+                datos, nueva_marca, hay_mas = capa["exportar_cambios"](int(qs["desde"]), formato, int(qs["limite"]))
+                return req._enviar(200, datos, etag=etag,
+                                   tipo="text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson",
+                                   encabezados={"X-Marca": str(nueva_marca), "X-Hay-Mas": "1" if hay_mas else "0"})
+            fila = int(partes[1])
+            if fila not in set(capa["obtener_metas_df"]()["fila"]):
+                return req._enviar(404, {"error": f"meta desconocida: {fila}"})
+            rango = None
+            if "desde" in qs or "hasta" in qs:
+                rango = (date.fromisoformat(qs.get("desde", "0001-01-01")).isoformat(),
+                         date.fromisoformat(qs.get("hasta", "9999-12-31")).isoformat())
+            cuerpo = {"sitio": sitio, "version": version, "fila": fila}
+            if "tam" in qs or "antes_de" in qs:
+                antes_de = int(qs["antes_de"]) if "antes_de" in qs else None
+                tam = min(max(int(qs.get("tam", PAGINA_HISTORIAL)), 1), 1000)
+                cuerpo["movimientos"], cuerpo["hay_mas"] = capa["obtener_historial_pagina"](fila, antes_de, rango, tam, con_archivo)
+            else:
+                cuerpo["movimientos"] = capa["obtener_historial"](fila, rango, con_archivo)
+            return req._enviar(200, cuerpo, etag=etag)
+        finally:
+            _SITIO_HILO.db_path = None
+
+@st.cache_resource(show_spinner=False)
+def _servidor_api(host: str, puerto: int) -> Optional[ServidorAPI]:
+    try:
+        return ServidorAPI(host, puerto)
+    except OSError as e:  # p. ej. puerto ocupado: la UI sigue funcionando
+        _log_api.warning("API JSON no disponible en %s:%s (%s)", host, puerto, e)
+        return None
+
+if os.environ.get("AVANCES_API_PORT"):
+    _api = _servidor_api(os.environ.get("AVANCES_API_HOST", "127.0.0.1"), int(os.environ["AVANCES_API_PORT"]))
+    if _api is not None and not _api.capa:
+        # Funciones de la capa de datos (las de este módulo; la base la elige cada request)
+        _api.capa = {nombre: globals()[nombre] for nombre in (
+            "_hash_plan", "_fila_plan", "_db_inicializada", "leer_version_ledger", "cargar_snapshot",
+            "excel_desglose", "obtener_metas_df", "obtener_historial", "obtener_historial_pagina",
+            "exportar_cambios",
+        )}
@@ -0,0 +1,245 @@
+# bench.py
+# Benchmark reproducible de app.py sobre un ledger sintético.
+#
+# Uso:
+#   python bench.py --metas 12 --movimientos 100000 --salida base.json
+#   python bench.py --movimientos 100000 --comparar base.json
+#
+# Genera una base SQLite con N metas (con la forma de PLAN_BASE) y M
+# movimientos, carga app.py sin servidor (modo "bare" de Streamlit) y mide
+# las consultas, escrituras, exportación Excel y gráficos. El resultado es
+# JSON para poder compararlo entre revisiones.
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import runpy
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+# =========================
+# 1) LEDGER SINTÉTICO
+# =========================
+def generar_ledger(db_path: str, plan: List[Dict[str, Any]], n_metas: int, n_movimientos: int,
+                   semilla: int = 42, dias: int = 365):
+    """Reemplaza metas y movimientos de `db_path` por datos sintéticos.
+
+    Las metas copian (cíclicamente) los textos del plan. Los movimientos son
+    mayormente avances chicos (1-10), con ~10% de correcciones negativas y
+    ~5% de notas sin cantidad; el acumulado nunca sale de [0, meta_total].
+    """
+    rnd = random.Random(semilla)
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM movimientos;")
+    cur.execute("DELETE FROM avance_por_meta;")
+    cur.execute("DELETE FROM metas;")
+
+    # Reparto desigual entre metas (unas pocas concentran la mayoría)
+    pesos = [1 / (i + 1) for i in range(n_metas)]
+    filas = rnd.choices(range(1, n_metas + 1), weights=pesos, k=n_movimientos)
+    por_fila = Counter(filas)
+
+    metas = []
+    for f in range(1, n_metas + 1):
+        it = plan[(f - 1) % len(plan)]
+        metas.append((
+            f, it["actividad_estrategica"],
+            max(10, int(por_fila.get(f, 0) * 5.5 * 0.8)),  # ~80% del avance esperado: algunas se completan
+            it.get("indole", ""), it.get("zona_trabajo", ""), it.get("actores", ""),
+            it.get("indicador_actividad", ""), it.get("consideraciones", ""),
+            it.get("periodicidad", ""), it.get("responsable", ""), it.get("efecto_esperado", ""),
+        ))
+    cur.executemany("""
+        INSERT INTO metas
+        (fila, actividad, meta_total, indole, zona_trabajo, actores, indicador_actividad,
+         consideraciones, periodicidad, responsable, efecto_esperado)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+    """, metas)
+
+    meta_por_fila = {m[0]: m[2] for m in metas}
+    avance = {f: 0 for f in meta_por_fila}
+    inicio = date.today() - timedelta(days=dias)
+    filas_mov = []
+    for i, f in enumerate(filas):
+        dia = inicio + timedelta(days=i * dias // max(n_movimientos, 1))
+        r = rnd.random()
+        if r < 0.05:
+            mov, nota = 0, "Observación sin cantidad"
+        elif r < 0.15:
+            mov, nota = -rnd.randint(1, 5), "Corrección"
+        else:
+            mov, nota = rnd.randint(1, 10), rnd.choice(["", "", "", "Operativo", "Reunión con actores"])
+        nuevo = max(0, min(meta_por_fila[f], avance[f] + mov))
+        delta = nuevo - avance[f]
+        avance[f] = nuevo
+        filas_mov.append((f, dia.strftime("%d-%m-%Y"), dia.isoformat(), abs(delta), nota, delta))
+    cur.executemany("""
+        INSERT INTO movimientos (fila, fecha, fecha_iso, cantidad, nota, delta)
+        VALUES (?, ?, ?, ?, ?, ?);
+    """, filas_mov)
+    conn.commit()
+    conn.execute("ANALYZE;")
+    conn.close()
+
+# =========================
+# 2) MEDICIÓN
+# =========================
+def medir(fn: Callable[[], Any], repeticiones: int, preparar: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return {
+        "ms_min": round(min(tiempos), 3),
+        "ms_mediana": round(statistics.median(tiempos), 3),
+        "ms_media": round(statistics.fmean(tiempos), 3),
+        "repeticiones": repeticiones,
+    }
+
+def cargar_app(app: str) -> Dict[str, Any]:
+    """Ejecuta app.py sin servidor y devuelve sus globales (funciones y constantes)."""
+    logging.disable(logging.WARNING)  # avisos de "sin streamlit run"
+    warnings.filterwarnings("ignore")
+    sys.path.insert(0, RAIZ)
+    return runpy.run_path(os.path.join(RAIZ, app), run_name="__bench__")
+
+def ejecutar(args) -> Dict[str, Any]:
+    os.chdir(args.dir or tempfile.mkdtemp(prefix="bench_avances_"))
+    g = cargar_app(args.app)  # crea el esquema en la carpeta de trabajo
+    t0 = time.perf_counter()
+    generar_ledger(g["DB_PATH"], g["SITIOS"][g["SITIO"]]["plan"], args.metas, args.movimientos, args.semilla)
+    generacion_ms = (time.perf_counter() - t0) * 1000
+
+    rep = args.repeticiones
+    snap = g["cargar_snapshot"]()
+    resumen = snap["resumen"]
+    fila_mayor = int(resumen.sort_values("n_movimientos", ascending=False)["fila"].iloc[0])
+    fila_graf = resumen.loc[resumen["fila"] == fila_mayor].iloc[0]
+    meta, avance = int(fila_graf["meta_total"]), int(fila_graf["avance"])
+    pct = float(fila_graf["porcentaje_val"])
+    signo = [1]
+
+    def _insertar():
+        signo[0] = -signo[0]  # alterna +1/-1 para no alejar el estado del generado
+        g["insertar_movimiento"](fila_mayor, signo[0], "bench")
+
+    def _excel(nombre: str):
+        fn = g[nombre]
+        return lambda: fn(g["SITIO"], snap["version"], None, None, snap["metas"], snap["resumen"])
+
+    def _grafico(construir):
+        return lambda: g["_png"](construir(), g["CacheGraficos"].DPI_PANTALLA)
+
+    series = g["leer_burnup_df"]()
+    with g["get_conn"]() as conn:  # marca de hace ~1 día de actividad
+        marca_dia = conn.execute("SELECT MAX(seq) FROM cambios_movimientos;").fetchone()[0] - args.movimientos // 365
+    ids_pagina = [m["id"] for m in g["obtener_historial_pagina"](fila_mayor, args.movimientos // 2)[0]]
+    casos = {
+        "obtener_resumen_df": (g["obtener_resumen_df"], None),
+        "cargar_snapshot": (g["cargar_snapshot"], None),
+        "obtener_historial": (lambda: g["obtener_historial"](fila_mayor), None),
+        "obtener_historial_pagina": (lambda: g["obtener_historial_pagina"](fila_mayor), None),
+        "insertar_movimiento": (_insertar, None),
+        "avance_hasta_id": (lambda: g["avance_hasta_id"](args.movimientos // 2), None),
+        "saldos_movimientos": (lambda: g["saldos_movimientos"](fila_mayor, ids_pagina), None),
+        "avance_al": (lambda: g["avance_al"]((date.today() - timedelta(days=180)).isoformat()), None),
+        "buscar_texto": (lambda: g["buscar_texto"]("reunion actores"), None),
+        "cambios_desde": (lambda: g["cambios_desde"](marca_dia), None),
+        "excel_desglose": (_excel("excel_desglose"), g["excel_desglose"].clear),
+        "excel_desglose_streaming": (_excel("excel_desglose_streaming"), g["excel_desglose_streaming"].clear),
+        "leer_burnup_df": (g["leer_burnup_df"], None),
+        "grafico_barras": (_grafico(lambda: g["_fig_barras"]("Bench", meta, avance, max(0, meta - avance), pct)), None),
+        "grafico_circular": (_grafico(lambda: g["_fig_circular"]("Bench", meta, avance, max(0, meta - avance), pct)), None),
+        "grafico_burnup": (_grafico(lambda: g["_fig_burnup"]("Bench", meta, series[series["fila"] == fila_mayor])), None),
+        "grafico_burnup_todas": (_grafico(lambda: g["_fig_burnup_todas"](snap["metas"], series)), None),
+    }
+    resultados = {}
+    for nombre, (fn, preparar) in casos.items():
+        if args.solo and nombre not in args.solo:
+            continue
+        fn()  # calentamiento (imports perezosos, caché de sentencias)
+        resultados[nombre] = medir(fn, rep, preparar)
+        print(f"{nombre:28s} {resultados[nombre]['ms_mediana']:10.2f} ms", file=sys.stderr)
+
+    return {
+        "revision": _revision(),
+        "fecha": date.today().isoformat(),
+        "entorno": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                    "plataforma": platform.platform()},
+        "parametros": {"app": args.app, "metas": args.metas, "movimientos": args.movimientos,
+                       "semilla": args.semilla, "repeticiones": rep},
+        "generacion_ms": round(generacion_ms, 1),
+        "resultados": resultados,
+    }
+
+def _revision() -> str:
+    try:
+        return subprocess.run(["git", "-C", RAIZ, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+# =========================
+# 3) COMPARACIÓN ENTRE REVISIONES
+# =========================
+def comparar(base: Dict[str, Any], actual: Dict[str, Any]) -> List[Dict[str, Any]]:
+    filas = []
+    for nombre, r in actual["resultados"].items():
+        b = base.get("resultados", {}).get(nombre)
+        if not b:
+            continue
+        filas.append({
+            "caso": nombre,
+            "base_ms": b["ms_mediana"],
+            "actual_ms": r["ms_mediana"],
+            "ratio": round(r["ms_mediana"] / b["ms_mediana"], 3) if b["ms_mediana"] else None,
+        })
+    return filas
+
+def main(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="Benchmark de app.py con un ledger sintético.")
+    p.add_argument("--app", default="app.py")
+    p.add_argument("--metas", type=int, default=12)
+    p.add_argument("--movimientos", type=int, default=10_000)
+    p.add_argument("--repeticiones", type=int, default=5)
+    p.add_argument("--semilla", type=int, default=42)
+    p.add_argument("--dir", help="carpeta de trabajo para la base (por defecto, una temporal)")
+    p.add_argument("--solo", nargs="*", help="medir solo estos casos")
+    p.add_argument("--salida", help="archivo JSON de resultados (por defecto, stdout)")
+    p.add_argument("--comparar", help="JSON de una corrida anterior para calcular ratios")
+    args = p.parse_args(argv)
+    if args.metas < 1:
+        p.error("--metas debe ser al menos 1")
+
+    # rutas relativas a la carpeta desde donde se invoca (ejecutar() hace chdir)
+    args.salida = os.path.abspath(args.salida) if args.salida else None
+    args.comparar = os.path.abspath(args.comparar) if args.comparar else None
+    resultado = ejecutar(args)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as fh:
+            resultado["comparacion"] = {"base": args.comparar, "casos": comparar(json.load(fh), resultado)}
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as fh:
+            fh.write(texto + "\n")
+    else:
+        print(texto)
+
+if __name__ == "__main__":
+    main()
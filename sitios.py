@@ -0,0 +1,316 @@
+# sitios.py
+# Delegaciones servidas por app.py. Cada una tiene su propia base SQLite,
+# pero todas comparten el mismo proceso, pool de conexiones y cachés.
+#
+# Mapeo de cada PLAN:
+# - actividad_estrategica -> actividad (UI)
+# - meta_cuantitativa     -> meta_total (cálculos)
+
+# === Santa Cruz (contenido del Excel pegado aquí) ===
+PLAN_SANTA_CRUZ = [
+    {
+        "fila": 1,
+        "indole": "Operativo",
+        "actividad_estrategica": (
+            "Coordinación y ejecución de operativos interinstitucionales nocturnos con enfoque en "
+            "objetivos estratégicos dentro del área de intervención."
+        ),
+        "zona_trabajo": "Tamarindo, Villarreal, Brasilito, Potrero y Surfside",
+        "actores": "Fuerza Pública; Policía de Tránsito; Policía de Migración; Policía Turística; DIAC",
+        "indicador_actividad": "Cantidad de operativos policiales",
+        "consideraciones": (
+            "1) Reforzar personal DIAC. 2) Considerar unidad K-9. 3) Ubicación aleatoria según análisis. "
+            "4) Operativos fugaces, de corta duración."
+        ),
+        "periodicidad": "Semanal",
+        "meta_cuantitativa": 24,
+        "responsable": "Sub Director Regional",
+        "efecto_esperado": (
+            "Reducción de actividades ilícitas y fortalecimiento de la presencia institucional en horarios de mayor riesgo."
+        ),
+    },
+    {
+        "fila": 2,
+        "indole": "Operativo",
+        "actividad_estrategica": (
+            "Despliegue de operativos presenciales en horarios nocturnos en zonas previamente identificadas como "
+            "puntos de interés, para reforzar la vigilancia, la disuasión del delito y la presencia institucional."
+        ),
+        "zona_trabajo": "Tamarindo",
+        "actores": "Fuerza Pública; Policía de Tránsito; Policía de Migración; Policía Turística; DIAC",
+        "indicador_actividad": "Cantidad de operativos policiales",
+        "consideraciones": (
+            "1) Apoyo constante de al menos 12 funcionarios de gestión durante la ejecución. "
+            "2) Disponer al menos de una unidad policial adicional/recurso móvil."
+        ),
+        "periodicidad": "Diario",
+        "meta_cuantitativa": 184,
+        "responsable": "Jefe de delegación policial de Santa Cruz",
+        "efecto_esperado": "Aumento de la percepción policial en puntos críticos mediante presencia policial visible.",
+    },
+    {
+        "fila": 3,
+        "indole": "Gestión administrativa",
+        "actividad_estrategica": (
+            "Gestión institucional mediante oficio para asignación de recurso humano y transporte policial "
+            "para garantizar cobertura operativa diaria en zonas de interés."
+        ),
+        "zona_trabajo": "Tamarindo",
+        "actores": "Fuerza Pública",
+        "indicador_actividad": "Cantidad de oficios emitidos",
+        "consideraciones": "N/A",
+        "periodicidad": "Semestral",
+        "meta_cuantitativa": 1,
+        "responsable": "Director Regional",
+        "efecto_esperado": (
+            "Asegurar presencia policial continua y eficaz en zonas priorizadas, mediante dotación oportuna del personal "
+            "y medios logísticos requeridos."
+        ),
+    },
+    {
+        "fila": 4,
+        "indole": "Preventivo",
+        "actividad_estrategica": (
+            "Ejecución de actividades cívico-policiales en espacios públicos y centros educativos, para fortalecer "
+            "vínculos comunitarios, cultura de paz, prevención y convivencia."
+        ),
+        "zona_trabajo": "Villarreal",
+        "actores": "Fuerza Pública",
+        "indicador_actividad": "Cantidad de cívicos policiales",
+        "consideraciones": "N/A",
+        "periodicidad": "Mensual",
+        "meta_cuantitativa": 6,
+        "responsable": "Director Regional",
+        "efecto_esperado": (
+            "Fortalecer el vínculo comunidad–Fuerza Pública y promover convivencia y cultura de paz, "
+            "con presencia en espacios públicos y centros educativos."
+        ),
+    },
+    {
+        "fila": 5,
+        "indole": "Operativo",
+        "actividad_estrategica": (
+            "Despliegue de operativos presenciales en horarios mixtos en puntos de interés para reforzar vigilancia, "
+            "disuasión del delito y presencia institucional."
+        ),
+        "zona_trabajo": "Flamingo",
+        "actores": "Fuerza Pública",
+        "indicador_actividad": "Cantidad de operativos policiales",
+        "consideraciones": (
+            "1) Apoyo constante de al menos 12 funcionarios de gestión. "
+            "2) Disponer al menos de una unidad policial adicional/recurso móvil."
+        ),
+        "periodicidad": "Diario",
+        "meta_cuantitativa": 184,
+        "responsable": "Jefe de delegación policial de Santa Cruz",
+        "efecto_esperado": "Aumento de la percepción policial visible en puntos críticos.",
+    },
+    {
+        "fila": 6,
+        "indole": "Operativo",
+        "actividad_estrategica": (
+            "Operativos interinstitucionales de control a ventas informales y actividades no autorizadas de cobro de "
+            "parqueo en zona costera."
+        ),
+        "zona_trabajo": "Flamingo y Brasilito",
+        "actores": "Fuerza Pública; Policía de Tránsito; Policía de Migración; Policía Turística; DIAC",
+        "indicador_actividad": "Cantidad de operativos policiales",
+        "consideraciones": "N/A",
+        "periodicidad": "Quincenal",
+        "meta_cuantitativa": 12,
+        "responsable": "Jefe de delegación policial de Santa Cruz",
+        "efecto_esperado": (
+            "Recuperar el orden en el espacio público; reducir informalidad y garantizar condiciones más seguras y "
+            "reguladas para residentes, turistas y comercios."
+        ),
+    },
+    {
+        "fila": 7,
+        "indole": "Preventivo",
+        "actividad_estrategica": (
+            "Implementación de acciones preventivas, lideradas por programas policiales, orientadas a la recuperación "
+            "y apropiación positiva de espacios públicos."
+        ),
+        "zona_trabajo": "Brasilito",
+        "actores": "Fuerza Pública",
+        "indicador_actividad": "Cantidad de acciones preventivas",
+        "consideraciones": "N/A",
+        "periodicidad": "Quincenal",
+        "meta_cuantitativa": 12,
+        "responsable": "Director Regional",
+        "efecto_esperado": (
+            "Transformar espacios públicos en entornos seguros y activos, fomentando apoyo comunitario y reduciendo "
+            "vulnerabilidades ante actividades delictivas."
+        ),
+    },
+    {
+        "fila": 8,
+        "indole": "Preventivo",
+        "actividad_estrategica": (
+            "Talleres y jornadas de sensibilización en seguridad comercial para fortalecer capacidades preventivas del "
+            "sector empresarial."
+        ),
+        "zona_trabajo": "Brasilito",
+        "actores": "Fuerza Pública",
+        "indicador_actividad": "Cantidad de talleres",
+        "consideraciones": "N/A",
+        "periodicidad": "Semestral",
+        "meta_cuantitativa": 1,
+        "responsable": "Director Regional",
+        "efecto_esperado": (
+            "Mejorar la percepción de seguridad y fortalecer la prevención del delito en el sector comercial mediante "
+            "buenas prácticas y articulación con la Fuerza Pública."
+        ),
+    },
+    {
+        "fila": 9,
+        "indole": "Operativo",
+        "actividad_estrategica": (
+            "Operativos focalizados para el abordaje e identificación de personas y vehículos vinculados a delitos "
+            "de robo en viviendas, con base en análisis de inteligencia."
+        ),
+        "zona_trabajo": "Brasilito",
+        "actores": "Fuerza Pública",
+        "indicador_actividad": "Cantidad de operativos policiales",
+        "consideraciones": "N/A",
+        "periodicidad": "Mensual",
+        "meta_cuantitativa": 6,
+        "responsable": "DIAC",
+        "efecto_esperado": (
+            "Reducir robos a viviendas mediante identificación oportuna de objetivos y fortalecimiento de la capacidad "
+            "de respuesta y disuasión policial en zonas residenciales vulnerables."
+        ),
+    },
+    {
+        "fila": 10,
+        "indole": "Preventivo",
+        "actividad_estrategica": (
+            "Capacitaciones en Seguridad Comunitaria dirigidas a estrategias inter-organizacionales para fortalecer "
+            "integración y participación en actividades preventivas."
+        ),
+        "zona_trabajo": "Brasilito",
+        "actores": "Fuerza Pública",
+        "indicador_actividad": "Cantidad de capacitaciones",
+        "consideraciones": "N/A",
+        "periodicidad": "Semestral",
+        "meta_cuantitativa": 1,
+        "responsable": "Director Regional",
+        "efecto_esperado": (
+            "Mejorar el nivel de conocimiento y la capacidad de respuesta de la población ante incidentes, promoviendo "
+            "su vinculación con estrategias de seguridad comunitaria y cohesión social."
+        ),
+    },
+]
+
+# === Santa Teresa (de la matriz) ===
+PLAN_SANTA_TERESA = [
+    {
+        "fila": 1,
+        "indole": "Operativo",
+        "actividad_estrategica": "Coordinar esfuerzos interinstitucionales para prevenir y reducir el robo de motocicletas.",
+        "zona_trabajo": "Santa Teresa",
+        "actores": "Tránsito/Migración",
+        "indicador_actividad": "Operativos",
+        "consideraciones": "No aplica",
+        "periodicidad": "2 por semana",
+        "meta_cuantitativa": 20,
+        "responsable": "Dirección Regional",
+        "efecto_esperado": (
+            "1- Disminución de la tasa de robo de motocicletas. "
+            "2- Incremento en la detención y judicialización de los responsables. "
+            "3- Desarticulación de bandas dedicadas a este delito."
+        ),
+    },
+    {
+        "fila": 2,
+        "indole": "Operativo",
+        "actividad_estrategica": "Intensificar los operativos de investigación conjuntos con OIJ para captura de responsables y recuperación de motocicletas robadas.",
+        "zona_trabajo": "Santa Teresa",
+        "actores": "OIJ",
+        "indicador_actividad": "Operativos",
+        "consideraciones": "No aplica",
+        "periodicidad": "1 por quincena",
+        "meta_cuantitativa": 10,
+        "responsable": "Dirección Regional",
+        "efecto_esperado": (
+            "1- Desarticulación de estructuras criminales. "
+            "2- Creación de un fuerte efecto disuasorio. "
+            "3- Disminución estadística del delito."
+        ),
+    },
+    {
+        "fila": 3,
+        "indole": "Operativo",
+        "actividad_estrategica": "Implementar sistema de registro y fiscalización georreferenciado de talleres y chatarreras para prevenir venta de partes y motocicletas de procedencia ilícita.",
+        "zona_trabajo": "Santa Teresa",
+        "actores": "OIJ",
+        "indicador_actividad": "Informe realizado",
+        "consideraciones": "Destacar la georreferenciación actualizada de los lugares de interés policial.",
+        "periodicidad": "1 bimensual actualizado y georreferenciado",
+        "meta_cuantitativa": 2,
+        "responsable": "Dirección Regional",
+        "efecto_esperado": (
+            "1- Reducción sostenida del delito de robo de motocicletas. "
+            "2- Fortalecimiento de la capacidad de control del Estado."
+        ),
+    },
+    {
+        "fila": 4,
+        "indole": "Operativo",
+        "actividad_estrategica": "Identificar, geolocalizar y categorizar puntos de búnkers y casas de venta de droga para optimizar operativos y desarticulación de redes.",
+        "zona_trabajo": "Santa Teresa",
+        "actores": "OIJ",
+        "indicador_actividad": "Informe realizado",
+        "consideraciones": "Destacar la georreferenciación actualizada de los lugares de interés policial.",
+        "periodicidad": "1 bimensual actualizado y georreferenciado",
+        "meta_cuantitativa": 2,
+        "responsable": "Dirección Regional",
+        "efecto_esperado": (
+            "1- Creación de un Mapa Dinámico de venta de droga. "
+            "2- Optimización de recursos policiales. "
+            "3- Análisis predictivo. "
+            "4- Aumento en la efectividad de acciones policiales y allanamientos."
+        ),
+    },
+    {
+        "fila": 5,
+        "indole": "Operativo",
+        "actividad_estrategica": "Plan de intervención interinstitucional en bares para prevención de delitos, narcomenudeo y actos de violencia.",
+        "zona_trabajo": "Santa Teresa",
+        "actores": "FP/Turística/Tránsito/OIJ",
+        "indicador_actividad": "Operativos",
+        "consideraciones": "No aplica",
+        "periodicidad": "1 bimensual",
+        "meta_cuantitativa": 2,
+        "responsable": "Dirección Regional",
+        "efecto_esperado": (
+            "1- Desplazamiento de la actividad criminal. "
+            "2- Reducción de la violencia y riñas. "
+            "3- Efecto disuasorio. "
+            "4- Prevención del narcomenudeo."
+        ),
+    },
+]
+
+# Para sumar una delegación basta con agregar su entrada aquí.
+# - db_path: archivo SQLite propio (Santa Cruz conserva el histórico avances.db)
+# - sincronizar_plan: True reescribe las metas desde el plan en cada arranque;
+#   False solo siembra el plan si la tabla de metas está vacía.
+# - mostrar_zona: incluye la zona de trabajo en el detalle de cada meta
+SITIOS = {
+    "santa_cruz": {
+        "nombre": "Santa Cruz",
+        "db_path": "avances.db",
+        "plan": PLAN_SANTA_CRUZ,
+        "sincronizar_plan": True,
+        "mostrar_zona": True,
+    },
+    "santa_teresa": {
+        "nombre": "Santa Teresa",
+        "db_path": "avances_santa_teresa.db",
+        "plan": PLAN_SANTA_TERESA,
+        "sincronizar_plan": False,
+        "mostrar_zona": False,  # la zona siempre es la propia delegación
+    },
+}
+SITIO_POR_DEFECTO = "santa_cruz"